@@ -0,0 +1,78 @@
+"""Benchmark loading '.cmg' configurations with many plots, split into the time
+spent reading the data files up front and the time spent running the commands
+that build the figure. The data cache and the session data store are disabled,
+so every run reads its files, and the best of --repeat runs is reported.
+
+usage: python benchmarks/bench_load.py [nplots ...] [--repeat N]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from cmdGraph.cmg import prompt
+from cmdGraph.cmg.cache import dataCache
+from cmdGraph.cmg.store import dataStore
+
+def make_figure(tmp, nplots):
+    """Write nplots small x, y files and a '.cmg' file that styles each one."""
+    x = np.linspace(0, 1, 100)
+    fNames = []
+    for i in range(nplots):
+        fName = os.path.join(tmp, "xy{}.txt".format(i))
+        np.savetxt(fName, np.column_stack([x, x*i]), fmt='%.4f')
+        fNames.append(fName)
+    cmgName = os.path.join(tmp, "fig{}.cmg".format(nplots))
+    with open(cmgName, 'w') as f:
+        f.write("---cmdGraph---\nmode graph\nadat {}\n".format(' '.join(fNames)))
+        f.write("--xrange 0 1\n--yrange * *\n--xlabel x\n--ylabel y\n")
+        for i, fName in enumerate(fNames):
+            f.write("single {}\n--linewidth {}\n--linestyle :\n--label line#{}\n".format(
+                fName, 1 + i % 3, i))
+    return cmgName
+
+def timed_load(cmgName):
+    """Load a figure into a new prompt, the stages of do_load timed apart.
+    Returns the seconds spent reading the data and building the figure."""
+    p = prompt.cmgPrompt(interactive=False)
+    with open(os.devnull, 'w') as null:
+        stdout, sys.stdout = sys.stdout, null #silence single mode messages
+        try:
+            t0 = time.perf_counter()
+            cmdStrings, preloaded = p._read_load(cmgName)
+            p._preloaded.update(preloaded)
+            p._preload(cmdStrings)
+            t1 = time.perf_counter()
+            p._apply_load(cmdStrings)
+            p._View.fig.canvas.draw()
+            t2 = time.perf_counter()
+        finally:
+            sys.stdout = stdout
+    return t1 - t0, t2 - t1
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    args = sys.argv[1:]
+    repeat = 3
+    if '--repeat' in args:
+        i = args.index('--repeat')
+        repeat = int(args[i+1])
+        del args[i:i+2]
+    sizes = [int(n) for n in args] or [100, 300]
+    plt.rc('text', usetex=False)
+    prompt._pyplot._ready = True #skip TeX setup, it is not being measured
+    dataCache.enabled = False
+    dataStore.enabled = False
+    with tempfile.TemporaryDirectory() as tmp:
+        print("{:>7} {:>10} {:>11} {:>10}".format("plots", "read (s)", "build (s)", "total (s)"))
+        for nplots in sizes:
+            cmgName = make_figure(tmp, nplots)
+            runs = []
+            for _ in range(repeat):
+                runs.append(timed_load(cmgName))
+                plt.close('all')
+            read, build = min(runs, key=sum)
+            print("{:>7} {:>10.3f} {:>11.3f} {:>10.3f}".format(nplots, read, build, read + build))
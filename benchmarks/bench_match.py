@@ -0,0 +1,54 @@
+"""Benchmark the KeyIndex quantum number matching used by linelistComparisonView
+against the pandas merge it replaced, on a pair of synthetic linelists.
+
+usage: python benchmarks/bench_match.py [nrows ...]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from cmdGraph.cmg.match import KeyIndex
+
+mergers = ['rotational_final', 'rotational_initial', 'vibrational_final', 'vibrational_initial']
+
+def make_linelist(nrows, seed):
+    """Random linelist with half-integer J and integer v quantum numbers."""
+    rng = np.random.default_rng(seed)
+    dat = np.empty(nrows, dtype=[
+        ('rotational_final', float), ('rotational_initial', float),
+        ('vibrational_final', np.int32), ('vibrational_initial', np.int32),
+        ('wavenumber', float), ('einstein_A', float), ('energy_final_cm', float)
+        ])
+    dat['rotational_final']    = rng.integers(0, 200, nrows) + 0.5
+    dat['rotational_initial']  = dat['rotational_final'] + rng.integers(-1, 2, nrows)
+    dat['vibrational_final']   = rng.integers(0, 30, nrows)
+    dat['vibrational_initial'] = rng.integers(0, 30, nrows)
+    for col in ['wavenumber', 'einstein_A', 'energy_final_cm']:
+        dat[col] = rng.random(nrows)
+    return dat
+
+def pandas_merge(prim, sec):
+    import pandas as pd
+    return pd.DataFrame(prim).merge(pd.DataFrame(sec), on=mergers, how='inner')
+
+def key_match(prim, sec):
+    return KeyIndex(prim, mergers).match(sec)
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - t0
+
+if __name__ == "__main__":
+    sizes = [int(float(n)) for n in sys.argv[1:]] or [10**4, 10**5, 10**6]
+    print("{:>10} {:>10} {:>12} {:>12} {:>8}".format(
+        "rows", "matched", "pandas (s)", "KeyIndex (s)", "speedup"))
+    for nrows in sizes:
+        prim, sec = make_linelist(nrows, 0), make_linelist(nrows, 1)
+        merged, tOld = timed(pandas_merge, prim, sec)
+        match, tNew = timed(key_match, prim, sec)
+        assert match.nMatched == len(merged)
+        print("{:>10} {:>10} {:>12.4f} {:>12.4f} {:>7.1f}x".format(
+            nrows, match.nMatched, tOld, tNew, tOld/tNew))
@@ -0,0 +1,48 @@
+"""Benchmark the chunked text parser used by xyData.read_file against the 
+original line-by-line reader. Test files are generated with the same shape as
+the bundled 'tests/*.csv' files, scaled up to the requested number of rows.
+
+usage: python benchmarks/bench_read.py [nrows ...]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from cmdGraph.cmg.data import xyData
+
+def legacy_read(fName):
+    """The original xyData reader, kept here for comparison."""
+    with open(fName, 'r') as f:
+        datLines = []
+        for l in f:
+            line = l.strip().split()
+            datLines.append(line)
+        return np.array(datLines, dtype=float).T
+
+def make_file(fName, nrows):
+    """Write an x, y file in the format of 'tests/xydata_test.csv'."""
+    x = np.arange(nrows)*0.01
+    np.savetxt(fName, np.column_stack([x, np.sin(x)]), fmt='%.3f')
+
+def best_of(func, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+if __name__ == "__main__":
+    sizes = [int(float(n)) for n in sys.argv[1:]] or [10**4, 10**5, 10**6]
+    with tempfile.TemporaryDirectory() as tmp:
+        print("{:>10} {:>12} {:>12} {:>8}".format("rows", "legacy (s)", "chunked (s)", "speedup"))
+        for nrows in sizes:
+            fName = os.path.join(tmp, "xydata_{}.csv".format(nrows))
+            make_file(fName, nrows)
+            assert np.array_equal(legacy_read(fName), xyData(fName).read_file().dat)
+            tOld = best_of(legacy_read, fName)
+            tNew = best_of(lambda f: xyData(f).read_file(), fName)
+            print("{:>10} {:>12.4f} {:>12.4f} {:>7.1f}x".format(nrows, tOld, tNew, tOld/tNew))
@@ -0,0 +1,47 @@
+"""Benchmark program startup. Times, in fresh interpreters, how long it takes
+to reach the first prompt and to create the first figure, and lists the most
+expensive imports on the way to the prompt using 'python -X importtime'.
+
+usage: python benchmarks/bench_startup.py [repeats]
+"""
+import os
+import sys
+import subprocess
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+stages = {
+    'prompt': "from cmdGraph.cmg import prompt; p = prompt.cmgPrompt()",
+    'figure': "from cmdGraph.cmg import prompt; p = prompt.cmgPrompt(); p._View",
+    }
+
+def run(code, *flags):
+    """Run code in a new interpreter with a non-GUI backend, returning its
+    stderr and its own measurement of wall time."""
+    timed = "import time; t0 = time.perf_counter(); {}; print(time.perf_counter() - t0)".format(code)
+    env = dict(os.environ, MPLBACKEND='Agg')
+    proc = subprocess.run([sys.executable, *flags, '-c', timed], cwd=root, env=env,
+        capture_output=True, text=True, check=True)
+    return float(proc.stdout.split()[-1]), proc.stderr
+
+def import_costs(code, top=10):
+    """Return the top cumulative import times in microseconds."""
+    _, err = run(code, '-X', 'importtime')
+    costs = []
+    for line in err.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            try:
+                costs.append((int(cumulative), name.strip()))
+            except ValueError:
+                continue
+    return sorted(costs, reverse=True)[:top]
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for stage, code in stages.items():
+        times = [run(code)[0] for _ in range(repeats)]
+        print("{:>8}: best {:.3f} s, mean {:.3f} s".format(stage, min(times), sum(times)/len(times)))
+    print("\nSlowest imports before the first prompt (cumulative):")
+    for cumulative, name in import_costs(stages['prompt']):
+        print("{:>10.1f} ms  {}".format(cumulative/1000, name))
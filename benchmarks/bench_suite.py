@@ -0,0 +1,219 @@
+"""Benchmark every stage of the program on synthetic files of each format, to
+catch performance regressions between commits. For each format and size the
+stages timed are:
+
+    detect      detect_filetype, sniffing the file on every run
+    read        the reader's read_file, with the data cache bypassed
+    add_plot    adding the data to a new View of the format's mode
+    redraw      a full draw of the figure on the Agg canvas
+    write       cmgData.write_file of the figure
+    load        cmgPrompt.do_load of the written figure, cache disabled
+    print       cmgPrompt.do_print of the loaded figure to '.png'
+    match       the KeyIndex merge of linelistComparisonView, Duo files only
+    compare     one KeyIndex matched against four linelists, Duo files only
+
+Each stage is timed, best of --repeat runs, and run once more under tracemalloc
+for its peak Python and numpy memory. Results are printed as a table, and
+written as JSON with --out so that two runs can be compared with --compare.
+
+usage: python benchmarks/bench_suite.py [--sizes 1e3 1e4 ...] [--formats xy stick ...]
+                                        [--repeat N] [--no-memory] [--data-dir DIR]
+                                        [--out results.json]
+       python benchmarks/bench_suite.py --compare old.json new.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generate import generators, make_duo
+
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from cmdGraph.cmg import prompt
+from cmdGraph.cmg.cache import dataCache
+from cmdGraph.cmg.store import dataStore
+from cmdGraph.cmg.data import detect_filetype, cmgData, _detected
+from cmdGraph.cmg.match import KeyIndex
+from cmdGraph.cmg.view import viewModes
+
+modes = {'xy': 'graph', 'stick': 'stick'} #View mode used for each plotted format
+mergers = ['rotational_final', 'rotational_initial', 'vibrational_final', 'vibrational_initial']
+
+def measure(func, setup=None, repeat=1, memory=True):
+    """Return the best time of repeat runs of func, and its peak traced memory
+    in bytes from one further run, or None without memory. setup is called
+    before every run, untimed, and its result passed to func."""
+    setup = setup or (lambda: ())
+    best = float('inf')
+    for _ in range(repeat):
+        args = setup()
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    peak = None
+    if memory:
+        args = setup()
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+def forget_detected():
+    """Setup for measure, so detect_filetype sniffs the file again rather than
+    returning the type it found for the file before."""
+    _detected.clear()
+    return ()
+
+def quiet(func):
+    """Wrap func to discard what it prints."""
+    def wrapped(*args):
+        with open(os.devnull, 'w') as null:
+            stdout, sys.stdout = sys.stdout, null
+            try:
+                return func(*args)
+            finally:
+                sys.stdout = stdout
+    return wrapped
+
+def new_view(mode):
+    plt.close('all')
+    return viewModes[mode](plt.figure())
+
+def view_with(mode, fName):
+    view = new_view(mode)
+    view.add_plot(detect_filetype(fName)(fName).read_file())
+    return view
+
+def data_file(dataDir, kind, nrows, seed=0):
+    """Path of a generated file, made only if it does not exist yet."""
+    fName = os.path.join(dataDir, "{}_{}_{}{}".format(kind, nrows, seed, generators[kind][1]))
+    if not os.path.isfile(fName):
+        if kind == 'duo' and seed:
+            make_duo(fName, nrows, seed, keep=0.9)
+        else:
+            generators[kind][0](fName, nrows, seed)
+    return fName
+
+def bench_format(kind, nrows, dataDir, repeat, memory):
+    """Yield (stage, seconds, peak bytes) for every stage of one format."""
+    fName = data_file(dataDir, kind, nrows)
+    fileType = detect_filetype(fName)
+    yield ('detect',) + measure(lambda: detect_filetype(fName), forget_detected, repeat=repeat, memory=memory)
+    yield ('read',) + measure(lambda: fileType(fName).read_file(), repeat=repeat, memory=memory)
+    if kind == 'duo':
+        other = data_file(dataDir, kind, nrows, seed=1)
+        prim, sec = fileType(fName).read_file().dat, fileType(other).read_file().dat
+        yield ('match',) + measure(lambda: KeyIndex(prim, mergers).match(sec),
+            repeat=repeat, memory=memory)
+        yield ('compare',) + measure(lambda: KeyIndex(prim, mergers).match_all([sec]*4),
+            repeat=repeat, memory=memory)
+    if kind not in modes:
+        return
+    mode = modes[kind]
+    data = fileType(fName).read_file()
+    yield ('add_plot',) + measure(lambda view: view.add_plot(data),
+        setup=lambda: (new_view(mode),), repeat=repeat, memory=memory)
+    yield ('redraw',) + measure(lambda view: view.fig.canvas.draw(),
+        setup=lambda: (view_with(mode, fName),), repeat=repeat, memory=memory)
+    cmgName = os.path.join(dataDir, "{}_{}.cmg".format(kind, nrows))
+    yield ('write',) + measure(lambda view: cmgData(cmgName).write_file(view),
+        setup=lambda: (view_with(mode, fName),), repeat=repeat, memory=memory)
+    yield ('load',) + measure(quiet(lambda p: p.do_load(cmgName)),
+        setup=lambda: (new_prompt(),), repeat=repeat, memory=memory)
+    pngName = os.path.join(dataDir, "{}_{}.png".format(kind, nrows))
+    yield ('print',) + measure(lambda p: p.do_print(pngName),
+        setup=lambda: (loaded_prompt(cmgName),), repeat=repeat, memory=memory)
+    plt.close('all')
+
+def new_prompt():
+    plt.close('all')
+    return prompt.cmgPrompt(interactive=False)
+
+def loaded_prompt(cmgName):
+    p = new_prompt()
+    quiet(p.do_load)(cmgName)
+    return p
+
+def machine():
+    """Description of the code and machine the benchmarks ran on."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit'    : commit,
+        'date'      : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python'    : platform.python_version(),
+        'numpy'     : np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'platform'  : platform.platform(),
+        'cpus'      : os.cpu_count(),
+        }
+
+def compare(oldName, newName):
+    """Print the ratio of new to old time and memory for every stage in both
+    result files."""
+    with open(oldName) as f:
+        old = {(r['format'], r['rows'], r['stage']): r for r in json.load(f)['results']}
+    with open(newName) as f:
+        new = json.load(f)['results']
+    print("{:>8} {:>10} {:>9} {:>12} {:>12} {:>8} {:>8}".format(
+        "format", "rows", "stage", "old (s)", "new (s)", "time", "memory"))
+    for r in new:
+        o = old.get((r['format'], r['rows'], r['stage']))
+        if o is None:
+            continue
+        mem = "{:.2f}x".format(r['peak_bytes']/o['peak_bytes']) if r['peak_bytes'] and o['peak_bytes'] else '-'
+        print("{:>8} {:>10} {:>9} {:>12.6f} {:>12.6f} {:>7.2f}x {:>8}".format(
+            r['format'], r['rows'], r['stage'], o['seconds'], r['seconds'],
+            r['seconds']/max(o['seconds'], 1e-9), mem))
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='bench_suite')
+    parser.add_argument('--sizes', nargs='+', default=['1e3', '1e4', '1e5'])
+    parser.add_argument('--formats', nargs='+', default=list(generators), choices=list(generators))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', dest='memory', action='store_false')
+    parser.add_argument('--data-dir', help="keep generated files here to reuse them")
+    parser.add_argument('--out', help="write results to this JSON file")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    dataCache.enabled = False #time the readers, not the cache
+    dataStore.enabled = False #nor the session store
+    prompt._pyplot(interactive=False)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        dataDir = args.data_dir or tmp
+        os.makedirs(dataDir, exist_ok=True)
+        print("{:>8} {:>10} {:>9} {:>12} {:>12}".format("format", "rows", "stage", "time (s)", "peak (MB)"))
+        for nrows in [int(float(n)) for n in args.sizes]:
+            for kind in args.formats:
+                for stage, seconds, peak in bench_format(kind, nrows, dataDir, args.repeat, args.memory):
+                    results.append({'format': kind, 'rows': nrows, 'stage': stage,
+                        'seconds': seconds, 'peak_bytes': peak})
+                    print("{:>8} {:>10} {:>9} {:>12.6f} {:>12}".format(kind, nrows, stage, seconds,
+                        '-' if peak is None else "{:.1f}".format(peak/1024**2)))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'machine': machine(), 'results': results}, f, indent=1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
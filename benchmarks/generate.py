@@ -0,0 +1,111 @@
+"""Generators of synthetic data files in every format read by cmdGraph, for the
+benchmarks. Files are written in chunks of rows, so sizes up to 10^8 rows and
+beyond never hold more than one chunk in memory, and the same seed always
+gives the same file.
+
+usage: python benchmarks/generate.py xy|stick|duo|roueff <nrows> <file> [seed]
+"""
+import sys
+import itertools
+import numpy as np
+
+_chunkRows_ = 1 << 18 #rows formatted and written at a time
+
+def _write_rows(f, fmt, columns):
+    """Write one line per row of the given columns with the row format fmt."""
+    nrows = len(columns[0])
+    f.write((fmt*nrows) % tuple(itertools.chain.from_iterable(zip(*columns))))
+
+def _chunks(nrows):
+    """Yield (start, stop) row ranges covering nrows rows."""
+    for start in range(0, nrows, _chunkRows_):
+        yield start, min(start + _chunkRows_, nrows)
+
+def make_xy(fName, nrows, seed=0):
+    """Two column x, y file with increasing x, as 'tests/xydata_test.csv'."""
+    rng = np.random.default_rng(seed)
+    with open(fName, 'w') as f:
+        for start, stop in _chunks(nrows):
+            x = np.arange(start, stop)*0.01
+            y = np.sin(x) + 0.1*rng.standard_normal(stop - start)
+            _write_rows(f, "%.3f %.5f\n", [x.tolist(), y.tolist()])
+
+def make_stick(fName, nrows, seed=0):
+    """Two column stick spectrum of wavenumber and intensity, with intensities
+    spread over many orders of magnitude as in real linelists."""
+    rng = np.random.default_rng(seed)
+    with open(fName, 'w') as f:
+        for start, stop in _chunks(nrows):
+            x = np.sort(rng.uniform(start, stop, stop - start))*0.01
+            height = 10.0**rng.uniform(-30, -18, stop - start)
+            _write_rows(f, "%.6f %.4E\n", [x.tolist(), height.tolist()])
+
+def _quanta(start, stop):
+    """Quantum numbers of rows start to stop. Every row has a different set of
+    (J final, J initial, v final, v initial), so matching two linelists pairs
+    each row at most once, as for a real linelist."""
+    i  = np.arange(start, stop)
+    vf = i % 7
+    vi = (i // 7) % 7
+    Jf = 1.5 + i // 49
+    Ji = Jf + (i % 3) - 1
+    return Jf, Ji, vf, vi
+
+_duoHeader_ = ("    J Gamma <-   J  Gamma Typ       Ei     <-      Ef          nu_if"
+    "        S(f<-i)          A(if)            I(f<-i)       State v lambda sigma  omega"
+    " <- State v lambda sigma  omega \n")
+_duoRow_ = ("  %6.1f  %s  <- %6.1f  %s  %s   %12.6f <- %12.6f  %12.6f  %12.4E  %12.4E  %12.4E"
+    " ( 1 %3d   1   0.5   1.5 ) <- ( 1 %3d   1  -0.5   0.5 )\n")
+
+def make_duo(fName, nrows, seed=0, keep=1.0):
+    """Duo '.out' file with a transitions block of nrows rows between some
+    other output. With keep below 1 only that fraction of the rows is kept, at
+    random, so two files made with different seeds match partially."""
+    rng = np.random.default_rng(seed)
+    with open(fName, 'w') as f:
+        f.write("Duo output\n (synthetic benchmark data)\n\n" + _duoHeader_)
+        for start, stop in _chunks(nrows):
+            Jf, Ji, vf, vi = _quanta(start, stop)
+            rows = rng.random(stop - start) < keep
+            n = int(rows.sum())
+            Ef = 10.0*Jf[rows]*(Jf[rows] + 1) + 1000.0*vf[rows]
+            Ei = 10.0*Ji[rows]*(Ji[rows] + 1) + 1000.0*vi[rows]
+            _write_rows(f, _duoRow_, [
+                Jf[rows].tolist(), rng.choice(['e', 'f'], n).tolist(),
+                Ji[rows].tolist(), rng.choice(['e', 'f'], n).tolist(),
+                rng.choice(['P', 'Q', 'R'], n).tolist(),
+                Ef.tolist(), Ei.tolist(), np.abs(Ef - Ei + rng.normal(0, 1e-3, n)).tolist(),
+                rng.random(n).tolist(), (10.0**rng.uniform(-8, 2, n)).tolist(),
+                (10.0**rng.uniform(-30, -18, n)).tolist(),
+                vf[rows].tolist(), vi[rows].tolist()
+                ])
+        f.write("\ndone\n\nEnd of Duo output\n")
+
+def make_roueff(fName, nrows, seed=0):
+    """Sixteen column linelist in the format of Roueff et al. 2019."""
+    rng = np.random.default_rng(seed)
+    row = "%d %d %d %d %.4f 0.0010 %.4f 0.0100 %.3e %.3e %.3e 0.0 %.4f 0.0100 %.2f %d\n"
+    with open(fName, 'w') as f:
+        for start, stop in _chunks(nrows):
+            Jf, Ji, vf, vi = _quanta(start, stop)
+            n = stop - start
+            E2, M1 = 10.0**rng.uniform(-12, -6, n), 10.0**rng.uniform(-14, -8, n)
+            Ef = 10.0*Jf*(Jf + 1) + 1000.0*vf
+            wn = 1000.0 + rng.random(n)*4000
+            _write_rows(f, row, [
+                vf.tolist(), (Jf - 0.5).astype(int).tolist(), vi.tolist(), (Ji + 0.5).astype(int).tolist(),
+                wn.tolist(), (1e4/wn).tolist(), E2.tolist(), M1.tolist(), (E2 + M1).tolist(),
+                Ef.tolist(), (Ef*1.4388).tolist(), (2*Jf + 1).astype(int).tolist()
+                ])
+
+generators = {
+    'xy'    : (make_xy,     '.txt'),
+    'stick' : (make_stick,  '.stick'),
+    'duo'   : (make_duo,    '.out'),
+    'roueff': (make_roueff, '.txt'),
+    } #generator and file suffix of each format
+
+if __name__ == "__main__":
+    kind, nrows, fName = sys.argv[1], int(float(sys.argv[2])), sys.argv[3]
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    generators[kind][0](fName, nrows, seed)
@@ -1,3 +1,5 @@
+import sys
+
 from cmdGraph.cmg import prompt
 
 welcome_message = """
@@ -26,5 +28,8 @@ welcome_message = """
 """
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['render']: #headless batch rendering
+        from cmdGraph.cmg import render
+        sys.exit(render.main(sys.argv[2:]) > 0)
     print(welcome_message) #print welcome message
     prompt.run()
\ No newline at end of file
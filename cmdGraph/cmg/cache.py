@@ -0,0 +1,136 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+_cacheDir_ = os.environ.get('CMDGRAPH_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'cmdGraph'))
+_cacheBytes_ = 2 * 1024**3 #default size cap, 2 GB
+_version_ = 1 #bump to invalidate every existing cache entry
+
+### Cache Classes
+
+class DataCache:
+    """Persistent on-disk cache of parsed data arrays.
+
+    Each entry is a directory holding one '.npy' file per array of a Data
+    object plus a 'meta.json' file with its remaining attributes. Arrays are
+    memory-mapped when read back, so re-opening a large file costs little more
+    than the mapping itself.
+
+    Entries are keyed by the absolute path, size and modification time of the
+    source file together with the reader class, so an entry is never used once
+    the source changes. The total size of the cache directory is capped, and
+    the least recently used entries are removed first when it grows too large.
+    """
+    def __init__(self, directory=_cacheDir_, maxBytes=_cacheBytes_):
+        self.directory = directory
+        self.maxBytes  = maxBytes
+        self.enabled   = True
+
+    def _key(self, fName, reader, opts=None):
+        """Return the (prefix, key) pair for a source file. The prefix is
+        shared by every version of the same file, reader and reader options,
+        while the full key also identifies the file contents by its size and
+        mtime."""
+        path = os.path.abspath(fName)
+        stat = os.stat(path)
+        prefix = hashlib.sha1("{}|{}|{}|{}".format(
+            _version_, path, reader.__name__, json.dumps(opts or {}, sort_keys=True)
+            ).encode()).hexdigest()[:16]
+        ident = hashlib.sha1(
+            "{}|{}".format(stat.st_size, stat.st_mtime_ns).encode()
+            ).hexdigest()[:16]
+        return prefix, prefix + '-' + ident
+
+    def get(self, fName, reader, opts=None):
+        """Return (arrays, meta) for a cached file, or None if the file has no
+        valid cache entry."""
+        if not self.enabled:
+            return None
+        try:
+            _, key = self._key(fName, reader, opts)
+        except OSError:
+            return None
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, 'meta.json'), 'r') as f:
+                info = json.load(f)
+            arrays = {
+                name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r')
+                for name in info['arrays']
+                }
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(os.path.join(entry, 'meta.json')) #mark as recently used
+        return arrays, info['meta']
+
+    def put(self, fName, reader, arrays, meta, opts=None):
+        """Store the arrays and meta data parsed from a file. Older entries for
+        the same file are replaced. Failures to write are silently ignored, the
+        cache is only ever an optimisation."""
+        if not self.enabled:
+            return
+        tmp = None
+        try:
+            prefix, key = self._key(fName, reader, opts)
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = os.path.join(self.directory, key + '.tmp{}'.format(os.getpid()))
+            os.makedirs(tmp, exist_ok=True)
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp, name + '.npy'), arr)
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump({
+                    'source': os.path.abspath(fName),
+                    'reader': reader.__name__,
+                    'opts'  : opts or {},
+                    'arrays': list(arrays),
+                    'meta'  : meta
+                    }, f)
+            for old in os.listdir(self.directory):
+                if old.startswith(prefix) and '.tmp' not in old:
+                    shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+            os.rename(tmp, os.path.join(self.directory, key)) #atomic publish
+        except (OSError, TypeError, ValueError):
+            if tmp:
+                shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        """List (last used time, size in bytes, path) for every cache entry."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            try:
+                used = os.stat(os.path.join(entry, 'meta.json')).st_mtime
+                size = sum(
+                    os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry)
+                    )
+            except OSError:
+                continue
+            entries.append((used, size, entry))
+        return entries
+
+    def size(self):
+        """Total size of the cache in bytes."""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its cap."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.maxBytes:
+            _, size, entry = entries.pop(0)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        for _, _, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+dataCache = DataCache() #shared instance used by the program
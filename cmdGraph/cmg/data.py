@@ -1,50 +1,535 @@
 import cmd #for program commands
 import argparse #for figure arguments
 import numpy as np #for... need I explain?
-import matplotlib #urm... seems kinda obvious
-import matplotlib.pyplot as plt #convenience
 import sys
-import pandas as pd
+import os
+import re
+import warnings
+import gzip
+import bz2
+import lzma
+import queue
+import threading
+import io
+import time
+import json
+import struct
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from .cache import dataCache
+from .misc import stick_segments
+from .jobs import report_progress
 
 _small_ = 1e-300
+_chunkBytes_ = 1 << 22 #bytes read from file per parser chunk
+_comment_ = re.compile(rb'#[^\n]*') #comment runs from '#' to end of line
+_sniffBytes_ = 4096 #bytes from the start of a file given to sniff functions
+_compression_ = [
+    (b'\x1f\x8b',         gzip.open, gzip.GzipFile),
+    (b'BZh',              bz2.open,  bz2.BZ2File),
+    (b'\xfd7zXZ\x00',     lzma.open, lzma.LZMAFile)
+    ] #magic bytes, opener and file class of each compressed format
+_compressedSuffixes_ = ['.gz', '.bz2', '.xz']
+_prefetch_ = True #decompress compressed files in a background thread
+
+### Parsing functions
+
+def _open_data(fName):
+    """Open a data file for reading bytes. Files starting with the magic bytes
+    of gzip, bzip2 or xz are decompressed as they are read, whatever their
+    name, so compressed files stream straight into the parser."""
+    with open(fName, 'rb') as f:
+        magic = f.read(6)
+    for m, opener, _ in _compression_:
+        if magic.startswith(m):
+            return opener(fName, 'rb')
+    return open(fName, 'rb')
+
+def _is_compressed(f):
+    """Is the file object f decompressing its file?"""
+    return isinstance(f, tuple(fileClass for _, _, fileClass in _compression_))
+
+def _prefetched(f, chunkBytes, depth=2):
+    """Yield blocks of chunkBytes read from f by a background thread, which
+    keeps up to depth blocks ready. zlib, bz2 and lzma release the GIL while
+    decompressing, so decompression overlaps with parsing the blocks."""
+    blocks = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    def read():
+        try:
+            while not stop.is_set():
+                block = f.read(chunkBytes)
+                blocks.put(block)
+                if not block:
+                    break
+        except Exception as err:
+            blocks.put(err)
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        while True:
+            block = blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                break
+            yield block
+    finally: #stop early, e.g at the end of a Duo transitions block
+        stop.set()
+        while thread.is_alive(): #unblock the reader before f is closed
+            try:
+                blocks.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        thread.join()
+
+def _iter_chunks(f, chunkBytes=_chunkBytes_, prefetch=None):
+    """Yield blocks of complete lines from the binary file object f. Each block
+    is roughly chunkBytes long and always ends on a line boundary, so that no
+    row is split between blocks. With prefetch True blocks are read ahead in a
+    background thread, by default only if f is decompressing its file. Each
+    block is reported to the progress of a background job, if one is running,
+    which is where a cancelled job stops.
+    """
+    if prefetch is None:
+        prefetch = _prefetch_ and _is_compressed(f)
+    reads = _prefetched(f, chunkBytes) if prefetch else iter(lambda: f.read(chunkBytes), b'')
+    tail = b''
+    try:
+        for block in reads:
+            block = tail + block
+            cut = block.rfind(b'\n') + 1
+            tail = block[cut:]
+            if cut:
+                report_progress(cut)
+                yield block[:cut]
+    finally:
+        if prefetch:
+            reads.close()
+    if tail.strip():
+        report_progress(len(tail))
+        yield tail
+
+def _count_fields(block):
+    """Number of whitespace separated fields on the first data line of block."""
+    for line in block.splitlines():
+        fields = line.split(b'#', 1)[0].split()
+        if fields:
+            return len(fields)
+    return 0
+
+def _parse_block(block, ncols, fName=None):
+    """Convert a block of whitespace delimited text to an (n, ncols) float array.
+    Comments starting with '#' are ignored, as are blank lines. Every other line
+    must hold exactly ncols values, a ValueError naming the file fName and the
+    line is raised otherwise, rather than reflowing the values into rows."""
+    where = " in '{}'".format(fName) if fName else ''
+    if b'#' in block:
+        block = _comment_.sub(b'', block)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning) #numpy warns on bad data
+        try:
+            vals = np.fromstring(block, dtype=float, sep=' ')
+        except (DeprecationWarning, ValueError):
+            raise ValueError("Could not parse non-numeric data{}.".format(where))
+    bad = _bad_lines(block, ncols)
+    if len(bad):
+        line = block.split(b'\n')[bad[0]]
+        raise ValueError("Expected {} columns{}, found {} on line '{}'.".format(
+            ncols, where, len(line.split()), line.decode(errors='replace').strip()))
+    return vals.reshape(-1, ncols)
+
+def _bad_lines(block, ncols):
+    """Indices of the lines of block that hold values but not exactly ncols of
+    them. Fields are counted for every line at once, as the starts of runs of
+    non-whitespace bytes summed between newlines, so the check costs a few
+    passes over the block."""
+    b = np.frombuffer(block, dtype=np.uint8)
+    if not len(b):
+        return np.empty(0, dtype=int)
+    space = b <= 32 #whitespace and control bytes
+    starts = ~space
+    starts[1:] &= space[:-1]
+    lineStarts = np.concatenate(([0], np.flatnonzero(b == 10) + 1))
+    lineStarts = lineStarts[lineStarts < len(b)]
+    counts = np.add.reduceat(starts, lineStarts, dtype=np.int32)
+    return np.flatnonzero((counts != 0) & (counts != ncols))
+
+def _empty_columns(nrows, ncols, dtype=None):
+    """Allocate an (nrows, ncols) array, or a 1D array of nrows records if dtype
+    is a structured dtype."""
+    if dtype is not None and np.dtype(dtype).names:
+        return np.empty(nrows, dtype=dtype)
+    return np.empty((nrows, ncols), dtype=dtype or float)
+
+def _resize_columns(out, n, size):
+    """Resize an (ncols, capacity) column array in place to capacity size,
+    keeping the first n values of every column. The columns are moved within
+    the one block of memory, so no second array is allocated."""
+    ncols, capacity = out.shape
+    if size == capacity:
+        return
+    if size > capacity:
+        out.resize((ncols, size), refcheck=False)
+    flat = out.reshape(-1)
+    order = range(ncols - 1, 0, -1) if size > capacity else range(1, ncols)
+    for j in order: #move each column clear of those still to be moved
+        flat[j*size:j*size + n] = flat[j*capacity:j*capacity + n]
+    if size < capacity:
+        out.resize((ncols, size), refcheck=False)
+
+def _read_columns(fName, ncols=None, usecols=None, dtype=None, keep=None, columns=False,
+        chunkBytes=_chunkBytes_):
+    """Read a whitespace delimited numeric text file into an (n, ncols) float 
+    array. The file is parsed in blocks of chunkBytes directly into a 
+    preallocated array that doubles in size whenever it fills, so no 
+    intermediate Python objects are created per row. If ncols is not given it 
+    is taken from the first data line.
+
+    If usecols is given only those columns are kept. If dtype is a structured
+    dtype the result is instead a 1D record array with one field per kept
+    column, in order. With columns True the result is instead a C-ordered 
+    (ncols, n) array of dtype, one file column per row, so that a column is a
+    contiguous array. If keep is given, it is called with the rows of each
+    block and returns a mask of the rows to keep, so only the selected rows are
+    ever stored.
+    """
+    out = None
+    n = 0
+    with _open_data(fName) as f:
+        for block in _iter_chunks(f, chunkBytes):
+            if not ncols:
+                ncols = _count_fields(block)
+                if not ncols:
+                    continue
+            rows = _parse_block(block, ncols, fName)
+            if keep is not None:
+                rows = rows[keep(rows)]
+            if usecols is not None:
+                rows = rows[:, usecols]
+            if columns:
+                if out is None:
+                    out = np.empty((rows.shape[1], max(len(rows), 1024)), dtype=dtype or float)
+                if n + len(rows) > out.shape[1]:
+                    _resize_columns(out, n, max(n + len(rows), 2*out.shape[1])) #grow in place
+                out[:, n:n+len(rows)] = rows.T
+            else:
+                if out is None:
+                    out = _empty_columns(max(len(rows), 1024), rows.shape[1], dtype)
+                while n + len(rows) > len(out):
+                    out.resize((2*len(out),) + out.shape[1:], refcheck=False) #grow in place
+                if out.dtype.names:
+                    for j, name in enumerate(out.dtype.names):
+                        out[name][n:n+len(rows)] = rows[:, j]
+                else:
+                    out[n:n+len(rows)] = rows
+            n += len(rows)
+            report_progress(nRows=len(rows))
+    nCols = len(usecols) if usecols is not None else (ncols or 0)
+    if columns:
+        if out is None:
+            return np.empty((nCols, 0), dtype=dtype or float)
+        _resize_columns(out, n, n) #trim unused capacity
+        return out
+    if out is None:
+        return _empty_columns(0, nCols, dtype)
+    out.resize((n,) + out.shape[1:], refcheck=False) #trim unused rows
+    return out
+
+class _FileTail:
+    """Position in a growing text file, so that only the lines appended since
+    the last read are read again. Lines are only consumed once they end in a
+    newline, a partly written last line is left for the next read.
+
+    The file is taken to have been truncated or replaced, as by log rotation,
+    if it is now shorter than the position reached, its inode has changed, or
+    its first bytes differ from those seen before. It is then read again from
+    the start.
+    """
+    _headBytes = 64
+
+    def __init__(self, fName):
+        self.fName  = fName
+        self.offset = 0 #end of the last complete line read
+        self._ino   = None
+        self._head  = b''
+
+    def read(self, chunkBytes=_chunkBytes_):
+        """Return (reset, blocks), where blocks iterates over blocks of the 
+        complete lines appended since the last read, and reset is True if the 
+        file was truncated or replaced so blocks start from the beginning."""
+        f = open(self.fName, 'rb')
+        stat = os.fstat(f.fileno())
+        head = f.read(self._headBytes)
+        if any(head.startswith(m) for m, _, _ in _compression_):
+            f.close()
+            raise ValueError("Compressed files can not be followed.")
+        reset = self._ino is not None and (
+            stat.st_ino != self._ino or stat.st_size < self.offset
+            or head[:len(self._head)] != self._head
+            )
+        if reset:
+            self.offset = 0
+        self._ino, self._head = stat.st_ino, head
+        return reset, self._blocks(f, chunkBytes)
+
+    def _blocks(self, f, chunkBytes):
+        """Yield blocks of complete lines from the current offset of file f,
+        advancing the offset past each, and close f at the end."""
+        with f:
+            f.seek(self.offset)
+            tail = b''
+            while True:
+                block = f.read(chunkBytes)
+                if not block:
+                    break
+                block = tail + block
+                cut = block.rfind(b'\n') + 1
+                tail = block[cut:]
+                if cut:
+                    self.offset += cut
+                    yield block[:cut]
+
+### Format registry
+
+_readers  = [] #(suffixes, sniff, Data class) in order of registration
+_detected = {} #Data class by (path, size, mtime) of detected files
+
+def register_reader(*suffixes, sniff=None):
+    """Class decorator adding a Data class to the formats found by 
+    detect_filetype. The class is used for files with one of the given 
+    suffixes, or any suffix if none are given, and if sniff is given only when
+    sniff returns True for the first bytes of the file. Readers registered 
+    later are tried first, so a new reader can take over files from an
+    existing one. For example:
+
+    | @register_reader('.dat', sniff=lambda head: head.startswith(b'# my format'))
+    | class myData(_Data):
+    |     def read_file(self):
+    |         ...
+    """
+    def register(cls):
+        _readers.append((tuple(suffix.lower() for suffix in suffixes), sniff, cls))
+        _detected.clear()
+        return cls
+    return register
+
+def _sniff_fields(n):
+    """Sniff function for text files with n numeric columns."""
+    return lambda head: _count_fields(head) == n
 
 ### Data Classes 
 
 class _Data:
-    def __init__(self, filename):
+    """Superclass of the Data formats.
+
+    Reader options given to adat are stored in opts. The 'where' option is a
+    list of [column, min, max] filters, with '*' for an open bound, and the
+    'min_intensity' option a lower bound on the format's intensity column. 
+    Readers apply both to every block of rows as it is parsed, see _keep.
+    """
+    _cacheable    = True  #may parsed arrays be stored in the data cache?
+    _followable   = False #may the file be followed with read_appended?
+    _metaAttrs    = []    #non-array attributes set by read_file
+    _fileCols     = {}    #file column of each column that rows can be filtered on
+    _intensityCol = None  #column filtered by the 'min_intensity' option
+
+    def __init__(self, filename, **opts):
         self.fName = filename
+        self.opts  = opts #reader options given to adat, saved with the figure
         self.dat = None
 
+    def opt_string(self):
+        """Return the reader options as they would be given to adat."""
+        opts = []
+        for key, val in sorted(self.opts.items()):
+            flag = '--' + key.replace('_', '-')
+            if val is True:
+                opts.append(flag)
+            elif isinstance(val, list): #repeated option
+                opts.extend('{} {}'.format(flag, ' '.join(item)) for item in val)
+            else:
+                opts.append('{} {}'.format(flag, val))
+        return ' '.join(opts)
+
+    def _keep(self, fileCols=None):
+        """Return a function giving the mask of rows, from a block of file rows,
+        that pass the 'where' and 'min_intensity' filters, or None if there are
+        no filters. fileCols maps column names to file columns, by default
+        _fileCols."""
+        fileCols = fileCols or self._fileCols
+        bound = lambda val, inf: inf if val == '*' else float(val)
+        filters = [(col, bound(lo, -np.inf), bound(hi, np.inf)) for col, lo, hi in self.opts.get('where', [])]
+        if 'min_intensity' in self.opts:
+            if self._intensityCol is None:
+                raise ValueError("{} has no intensity to filter on.".format(type(self).__name__))
+            filters.append((self._intensityCol, float(self.opts['min_intensity']), np.inf))
+        if not filters:
+            return None
+        unknown = sorted(set(col for col, _, _ in filters) - set(fileCols))
+        if unknown:
+            raise ValueError("Can not filter on {}, choose from {}.".format(
+                ', '.join(unknown), ', '.join(fileCols)))
+        filters = [(fileCols[col], lo, hi) for col, lo, hi in filters]
+        def keep(rows):
+            mask = np.ones(len(rows), dtype=bool)
+            for i, lo, hi in filters:
+                vals = rows[:, i].astype(float) #from text for Duo rows
+                mask &= (vals >= lo) & (vals <= hi)
+            return mask
+        return keep
+
+    def _export(self):
+        """Return the parsed state as a dictionary of arrays and a dictionary of
+        JSON serialisable meta data, the inverse of _restore."""
+        return {'dat': self.dat}, {a: getattr(self, a) for a in self._metaAttrs}
+
+    def _restore(self, arrays, meta):
+        """Set the parsed state from the output of _export."""
+        self.dat = arrays['dat']
+        for attr, val in meta.items():
+            setattr(self, attr, val)
+        return self
+
+    def read_appended(self, ncols=2, dtype=float):
+        """Read the rows appended to the file since the last call, the first
+        call reads the whole file. Rows are parsed into an (ncols, capacity)
+        buffer that doubles in size when full, and dat is a view of its filled
+        part, so following a file costs only the new bytes. Returns the number
+        of new rows, and whether the file was truncated or replaced, in which
+        case dat holds only the rows read again from the start."""
+        if not hasattr(self, '_fileTail'):
+            self._fileTail = _FileTail(self.fName)
+            self._buf = np.empty((ncols, 1024), dtype=dtype)
+            self._nRows = 0
+        reset, blocks = self._fileTail.read()
+        if reset:
+            self._nRows = 0
+        n0 = self._nRows
+        keep = self._keep()
+        for block in blocks:
+            rows = _parse_block(block, ncols, self.fName)
+            if keep is not None:
+                rows = rows[keep(rows)]
+            n = self._nRows + len(rows)
+            if n > self._buf.shape[1]:
+                buf = np.empty((ncols, max(n, 2*self._buf.shape[1])), dtype=self._buf.dtype)
+                buf[:, :self._nRows] = self._buf[:, :self._nRows]
+                self._buf = buf
+            self._buf[:, self._nRows:n] = rows.T
+            self._nRows = n
+        self.dat = self._buf[:, :self._nRows]
+        if self._nRows != n0 or reset: #x index is out of date
+            self.__dict__.pop('_xOrder', None)
+            self.__dict__.pop('_xSorted', None)
+        return self._nRows - n0, reset
+
+    def sorted_order(self):
+        """Return the indices that sort the rows by x, the first row of dat, or
+        None if they are already sorted. Computed on first use."""
+        if not hasattr(self, '_xOrder'):
+            x = self.dat[0]
+            self._xOrder = None if np.all(np.diff(x) >= 0) else np.argsort(x, kind='stable')
+        return self._xOrder
+
+    def x_rows(self, xmin, xmax, edges=False):
+        """Return the index of the rows with x between xmin and xmax, found by
+        binary search of the sorted x values. The index is a slice if x is in
+        order, or else an array of row numbers in order of x, for which the 
+        sorted x values are kept on first use. With edges True one more row is
+        included beyond each end, so that a line runs off the edges of the 
+        range."""
+        order = self.sorted_order()
+        if order is None:
+            xSorted = self.dat[0]
+        elif not hasattr(self, '_xSorted'):
+            xSorted = self._xSorted = self.dat[0][order]
+        else:
+            xSorted = self._xSorted
+        i0 = np.searchsorted(xSorted, xmin)
+        i1 = np.searchsorted(xSorted, xmax, side='right')
+        if edges:
+            i0, i1 = max(i0 - 1, 0), i1 + 1
+        return slice(i0, i1) if order is None else order[i0:i1]
+
+@register_reader('.txt', sniff=_sniff_fields(2))
 class xyData(_Data):
     """Data format for two column x, y data files where each row is a data point.
-    assumes no column headers. Currently just a skeleton class for basic operation."""
+    assumes no column headers. Currently just a skeleton class for basic operation.
+    
+    With the 'follow' reader option the file is read with read_appended."""
+    _followable = True
+    _fileCols   = {'x': 0, 'y': 1}
+
     def read_file(self):
         """Read x, y columns from file"""
-        with open(self.fName, 'r') as f:
-            datLines = []
-            for l in f:
-                line = l.strip().split()
-                datLines.append(line)
-            self.dat = np.array(datLines, dtype=float).T
+        if self.opts.get('follow'):
+            self.read_appended()
+        else:
+            self.dat = _read_columns(self.fName, keep=self._keep(), columns=True)
         return self
 
+@register_reader('.stick')
 class stickData(_Data):
     """Data format for stick spectra. Input file with two columns of x positions and
-    stick height is converted into a set of lines for matplotlib LineCollection."""
+    stick height is stored as a (2, N) array of x and height. The set of lines 
+    for matplotlib LineCollection is only built when requested by segments().
+    
+    The 'precision' reader option may be 'single' to store float32 values, and
+    with the 'follow' option the file is read with read_appended."""
+    _followable   = True
+    _metaAttrs    = ['ybounds']
+    _fileCols     = {'wavenumber': 0, 'intensity': 1}
+    _intensityCol = 'intensity'
+
     def read_file(self):
         """Read wavenumber, intensity columns from file"""
-        with open(self.fName, 'r') as f:
-            datLines = []
-            ymin = ymax = 0
-            for l in f:
-                x, y = l.strip().split()
-                datLines.append([[x, _small_], [x, y]])
-                ymin = float(y) if (float(y) < ymin) else ymin
-                ymax = float(y) if (float(y) > ymax) else ymax
-            self.dat = np.array(datLines, dtype=float)
-            self.ybounds = [float(ymin), (ymax)]
+        if self.opts.get('follow'):
+            self.read_appended()
+            return self
+        dtype = np.float32 if self.opts.get('precision') == 'single' else float
+        self.dat = _read_columns(self.fName, ncols=2, dtype=dtype, keep=self._keep(), columns=True)
+        self._set_ybounds(self.dat[1])
         return self
 
+    def _set_ybounds(self, height, ybounds=(0., 0.)):
+        """Extend ybounds, starting from ybounds, to cover the given heights.
+        Sticks always start from zero."""
+        self.ybounds = [
+            min(ybounds[0], float(height.min(initial=0.))),
+            max(ybounds[1], float(height.max(initial=0.)))
+            ]
+
+    def read_appended(self):
+        """Read the sticks appended to the file since the last call, see 
+        _Data.read_appended. Only the new sticks are used to extend ybounds."""
+        dtype = np.float32 if self.opts.get('precision') == 'single' else float
+        nNew, reset = _Data.read_appended(self, 2, dtype)
+        if reset or not hasattr(self, 'ybounds'):
+            self._set_ybounds(self.dat[1])
+        elif nNew:
+            self._set_ybounds(self.dat[1][-nNew:], self.ybounds)
+        if nNew or reset: #intensity order is out of date
+            self.__dict__.pop('_iOrder', None)
+        return nNew, reset
+
+    def segments(self):
+        """Return an (N, 2, 2) array of stick line segments from (x, _small_) to 
+        (x, height). The array is a new temporary, it is not kept by the Data
+        instance, and is always double precision so that _small_ is nonzero."""
+        return stick_segments(*self.dat, _small_)
+
+    def intensity_order(self):
+        """Return the indices that sort the sticks by decreasing height.
+        Computed on first use."""
+        if not hasattr(self, '_iOrder'):
+            self._iOrder = np.argsort(self.dat[1], kind='stable')[::-1]
+        return self._iOrder
+
+@register_reader('.cmg')
 class cmgData(_Data):
     """Data format for internal cmdGraph data files. This allows configurations
     to be saved so that they can be transferred and reloaded after the program
@@ -67,6 +552,8 @@ class cmgData(_Data):
     | --linecolour red
 
     """
+    _cacheable = False
+
     def write_file(self, view):
         """Write the View instance to a '.cmg' file with provided name. 
         
@@ -77,11 +564,23 @@ class cmgData(_Data):
 
         """
 
-        f = open(self.fName, 'w')
+        with open(self.fName, 'w') as f:
+            self._write_script(f, view)
+
+    def _write_script(self, f, view, extra=()):
+        """Write the commands that recreate the View instance to the text file
+        object f, with the figure commands extra after those of the View."""
         f.write("---cmdGraph---" + '\n')
         f.write("mode " + view.mode + '\n')
-        f.write(("adat " + " {}"*len(view.plots)
-            + '\n').format(*[P._Data.fName for P in view.plots]))
+        adatLines = [] #group consecutive files with the same reader options
+        for P in view.plots:
+            optString = P._Data.opt_string()
+            if adatLines and adatLines[-1][0] == optString:
+                adatLines[-1][1].append(P._Data.fName)
+            else:
+                adatLines.append((optString, [P._Data.fName]))
+        for optString, fNames in adatLines:
+            f.write(' '.join(['adat', optString, *fNames]).replace('  ', ' ') + '\n')
         _plotArgs = []
         for argName in view.argNames:
             try:
@@ -90,6 +589,8 @@ class cmgData(_Data):
                 f.write('--' + argName + ' ' + argVal + '\n')
             except:
                 _plotArgs.append(argName)
+        for line in extra:
+            f.write(line + '\n')
         for plot in view.plots:
             f.write('single ' + plot._Data.fName + '\n')
             for argName in _plotArgs:
@@ -99,7 +600,6 @@ class cmgData(_Data):
                     f.write('--' + argName + ' ' + argVal + '\n')
                 except:
                     pass
-        f.close()
 
     def read_file(self):
         """Read a View instance from file and return the list of command strings 
@@ -107,127 +607,447 @@ class cmgData(_Data):
 
         """
         with open(self.fName, 'r') as f:
-            datLines = []
-            start = False
-            for line in f:
-                line = line.strip()
-                while not start:
-                    if line == '---cmdGraph---':
-                        start = True
-                        line = ''
-                    continue
-                if line == '':
-                    continue
-                else:
-                    datLines.append(line)
+            self._read_script(f)
+        return self
+
+    def _read_script(self, f):
+        """Read the command strings from the lines of the text file object f."""
+        datLines = []
+        start = False
+        for line in f:
+            line = line.strip()
+            while not start:
+                if line == '---cmdGraph---':
+                    start = True
+                    line = ''
+                continue
+            if line == '':
+                continue
+            else:
+                datLines.append(line)
         if not start:
             print("Not recognised as a cmdGraph file.")
         else:
             self.dat = datLines
         return self
 
+@register_reader('.cmgz')
+class cmgzData(cmgData):
+    """Data format for self-contained cmdGraph bundles. A bundle is a zip file
+    holding the '.cmg' command script of a figure together with the parsed
+    arrays of every plot's data, so the figure can be loaded on another machine
+    without its data files and without parsing any text.
+
+    | figure.cmg            <- command script, as written by cmgData
+    | manifest.json         <- file name, reader, options and meta data of
+    |                          each plot's data, and of data held by the View
+    |                          such as compared linelists, with the members
+    |                          of its arrays
+    | data/<i>/<name>.npy   <- arrays in numpy '.npy' format
+
+    Arrays are stored uncompressed by default so that they can be memory-mapped
+    straight from the bundle, or deflated with compress True, in which case they
+    are decompressed into memory when loaded. Bundles are written to a temporary
+    file which then replaces the target, so a bundle is never left half written.
+    """
+    _version_ = 1
+
+    def __init__(self, filename, compress=False, **opts):
+        cmgData.__init__(self, filename, **opts)
+        self.compress = compress
+
+    def write_file(self, view):
+        """Write the View instance, the data of its plots and the data held by
+        the View to a bundle."""
+        self.write_snapshot(self.snapshot(view))
+
+    def snapshot(self, view, extra=()):
+        """Take what write_snapshot needs to write a bundle of the View instance
+        as it is now: its command script, with the figure commands extra after
+        those of the View, and the arrays and description of each Data object.
+        Arrays are referenced, not copied, so this is quick enough to run on
+        the prompt thread while the bundle is written in another."""
+        text = io.StringIO()
+        self._write_script(text, view, extra)
+        entries = []
+        for _Data in [plot._Data for plot in view.plots] + view.held_data():
+            if any(e['file'] == _Data.fName and e['opts'] == _Data.opts for e, _ in entries):
+                continue #same file and options in another plot
+            arrays, meta = _Data._export()
+            entries.append(({'file': _Data.fName, 'reader': type(_Data).__name__,
+                'opts': _Data.opts, 'meta': meta}, arrays))
+        return text.getvalue(), entries
+
+    def write_snapshot(self, snapshot):
+        """Write a snapshot taken by snapshot to the bundle."""
+        script, entries = snapshot
+        tmp = self.fName + '.tmp{}'.format(os.getpid())
+        try:
+            now = time.localtime()[:6]
+            with zipfile.ZipFile(tmp, 'w') as zf:
+                info = zipfile.ZipInfo('figure.cmg', date_time=now)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                zf.writestr(info, script)
+                manifest = []
+                for entry, arrays in entries:
+                    members = {}
+                    for name, arr in arrays.items():
+                        members[name] = 'data/{}/{}.npy'.format(len(manifest), name)
+                        info = zipfile.ZipInfo(members[name], date_time=now)
+                        info.compress_type = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+                        with zf.open(info, 'w', force_zip64=arr.nbytes > 2**30) as f:
+                            np.save(f, np.ascontiguousarray(arr))
+                    manifest.append(dict(entry, arrays=members))
+                zf.writestr('manifest.json', json.dumps(
+                    {'version': self._version_, 'data': manifest}),
+                    compress_type=zipfile.ZIP_DEFLATED)
+            os.replace(tmp, self.fName) #atomic publish
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def read_file(self):
+        """Read the command strings of a bundle, and the description of the data
+        stored in it."""
+        with zipfile.ZipFile(self.fName) as zf:
+            with zf.open('figure.cmg') as f:
+                self._read_script(io.TextIOWrapper(f))
+            manifest = json.loads(zf.read('manifest.json'))
+        if manifest['version'] > self._version_:
+            raise ValueError("Bundle '{}' was written by a newer cmdGraph.".format(self.fName))
+        self.entries = manifest['data']
+        return self
+
+    def data(self):
+        """Return a list of Data instances for the data stored in the bundle,
+        with their arrays mapped from the bundle file."""
+        readers = {cls.__name__: cls for _, _, cls in _readers}
+        out = []
+        with open(self.fName, 'rb') as f, zipfile.ZipFile(f) as zf:
+            for entry in self.entries:
+                arrays = {
+                    name: self._load_array(f, zf.getinfo(member))
+                    for name, member in entry['arrays'].items()
+                    }
+                _Data = readers[entry['reader']](entry['file'], **entry['opts'])
+                out.append(_Data._restore(arrays, entry['meta']))
+        return out
+
+    def _load_array(self, f, info):
+        """Memory-map a stored '.npy' member of the bundle open as f, or read
+        it into memory if it is compressed."""
+        if info.compress_type != zipfile.ZIP_STORED:
+            with zipfile.ZipFile(f) as zf, zf.open(info) as member:
+                return np.load(member)
+        f.seek(info.header_offset)
+        header = f.read(30) #zip local file header
+        nameLen, extraLen = struct.unpack('<HH', header[26:30])
+        f.seek(info.header_offset + 30 + nameLen + extraLen)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        if not np.prod(shape):
+            return np.empty(shape, dtype=dtype) #an empty array can not be mapped
+        return np.memmap(self.fName, dtype=dtype, mode='r', offset=f.tell(),
+            shape=shape, order='F' if fortran else 'C')
+
+@register_reader('.out')
 class duoOutData(_Data):
     """Data format for reading transition data from Duo '.out' files. Automatically
     locates and extracts the transitions data from the Einstein coefficients and
-    linestrengths section of the output file. Returns a numpy array of relevant values."""
+    linestrengths section of the output file. Returns a numpy structured array
+    with one typed field per column.
+
+    Numeric columns are stored as floats, or integers for the vibrational and
+    lambda quantum numbers. Label columns (parities, branch and electronic
+    state) are stored as small integer codes, with the labels for each code in
+    the 'categories' attribute. The 'usecols' reader option is a comma separated
+    list of the columns to keep, by default every column is loaded."""
+    columns = [
+        'rotational_final',
+        'gamma_final',
+        'rotational_initial',
+        'gamma_initial',
+        'transition_branch',
+        'energy_final_cm',
+        'energy_initial_cm',
+        'wavenumber',
+        'linestrength_S',
+        'einstein_A',
+        'intensity_I',
+        'electronic_final',
+        'vibrational_final',
+        'lambda_final',
+        'sigma_final',
+        'omega_final',
+        'electronic_initial',
+        'vibrational_initial',
+        'lambda_initial',
+        'sigma_initial',
+        'omega_initial'
+        ]
+    _intCols = ['vibrational_final', 'vibrational_initial', 'lambda_final', 'lambda_initial']
+    _catCols = [
+        'gamma_final', 'gamma_initial', 'transition_branch', 
+        'electronic_final', 'electronic_initial'
+        ]
+    _header_ = b'J Gamma <-   J  Gamma Typ' #start of transitions block header line
+    _chunkBytes_ = 1 << 20 #smaller chunks, rows are split into many tokens
+    _metaAttrs = ['cols', 'categories']
+    _intensityCol = 'intensity_I'
+
+    def _dtype(self, cols):
+        """Structured dtype for the selected columns."""
+        return np.dtype([(
+            col, np.int16 if col in self._catCols else (np.int32 if col in self._intCols else float)
+            ) for col in cols])
+
     def read_file(self):
-        """Read linelist from Duo output file."""
-        header = "    J Gamma <-   J  Gamma Typ       Ei     <-      Ef          nu_if        S(f<-i)          A(if)            I(f<-i)       State v lambda sigma  omega <- State v lambda sigma  omega "
-        with open(self.fName, 'r') as f:
-            datLines = []
-            atBlock = False
-            l = 0
-            while True:
-                l += 1
-                line = f.readline().rstrip('\n')
-                if line == header:
+        """Read linelist from Duo output file. The file is streamed in chunks, the
+        transitions block header is located by a byte search and each chunk of
+        rows is converted straight into the typed output array."""
+        self.cols = self.opts['usecols'].split(',') if 'usecols' in self.opts else list(self.columns)
+        unknown = set(self.cols) - set(self.columns)
+        if unknown:
+            raise ValueError("Unknown Duo columns: {}".format(', '.join(sorted(unknown))))
+        index = [self.columns.index(col) for col in self.cols]
+        dtype = self._dtype(self.cols)
+        codes = {col: {} for col in self.cols if col in self._catCols} #label -> code
+        keep = self._keep({
+            col: i for i, col in enumerate(self.columns) if col not in self._catCols
+            }) #label columns can not be filtered
+        out = np.empty(1024, dtype=dtype)
+        n = 0
+        atBlock = False
+        with _open_data(self.fName) as f:
+            for block in _iter_chunks(f, self._chunkBytes_):
+                if not atBlock:
+                    start = block.find(self._header_)
+                    if start < 0:
+                        continue
                     atBlock = True
-                    continue
-                if atBlock and line:
-                    if line == "done":
-                        break
-                    line = line.replace('<-', '').replace('(', '').replace(')', '')
-                    datLines.append(
-                        line.replace('<-', '').replace('(', '').replace(')', '').split()
-                        ) #remove non-data columns
-        self.dat = np.array(datLines)
-        self.cols = [
-            'rotational_final',
-            'gamma_final',
-            'rotational_initial',
-            'gamma_initial',
-            'transition_branch',
-            'energy_final_cm',
-            'energy_initial_cm',
-            'wavenumber',
-            'linestrength_S',
-            'einstein_A',
-            'intensity_I',
-            'electronic_final',
-            'vibrational_final',
-            'lambda_final',
-            'sigma_final',
-            'omega_final',
-            'electronic_initial',
-            'vibrational_initial',
-            'lambda_initial',
-            'sigma_initial',
-            'omega_initial'
-            ]
-        self.typedict = {key: float for key in self.cols}
-        self.typedict.update({'gamma_initial': str, 'gamma_final': str, 'transition_branch': str})
+                    block = block[block.find(b'\n', start) + 1:]
+                end = block.find(b'\ndone')
+                done = end >= 0 or block.startswith(b'done')
+                block = block[:max(end, 0)] if done else block
+                rows = self._parse_block(block)
+                if keep is not None:
+                    rows = rows[keep(rows)]
+                if len(rows):
+                    while n + len(rows) > len(out):
+                        out.resize(2*len(out), refcheck=False) #grow in place
+                    chunk = out[n:n+len(rows)]
+                    for col, i in zip(self.cols, index):
+                        if col in codes:
+                            labels, inverse = np.unique(rows[:, i], return_inverse=True)
+                            lookup = np.array([
+                                codes[col].setdefault(label, len(codes[col])) for label in labels
+                                ], dtype=np.int16)
+                            chunk[col] = lookup[inverse]
+                        else:
+                            chunk[col] = rows[:, i].astype(float)
+                    n += len(rows)
+                    report_progress(nRows=len(rows))
+                if done:
+                    break
+        out.resize(n, refcheck=False) #trim unused rows
+        self.dat = out
+        self.categories = {
+            col: [label.decode() for label in labels] for col, labels in codes.items()
+            }
         return self
 
+    def _parse_block(self, block):
+        """Split a block of transition rows into an (n, 21) array of byte strings,
+        removing the '<-' and bracket separators that are not data columns."""
+        tokens = block.replace(b'<-', b' ').translate(None, b'()').split()
+        if len(tokens) % len(self.columns):
+            raise ValueError("Malformed transition row in '{}'.".format(self.fName))
+        return np.array(tokens).reshape(-1, len(self.columns))
+
+@register_reader('.txt', sniff=_sniff_fields(16))
 class roueffData(_Data):
-    """Data format for linelist in the format given by Roueff et al. 2019."""
+    """Data format for linelist in the format given by Roueff et al. 2019.
+
+    The 16 file columns are parsed in one vectorised pass, keeping only the 
+    columns in 'cols' as fields of a typed structured array. The Einstein A 
+    coefficient column is chosen by the 'lines' reader option, which may be 
+    'E2', 'M1' or 'both' (the default, for the total of both), which is also
+    the column filtered by the 'min_intensity' option."""
+    _intensityCol = 'einstein_A'
+    _lineCols = {'E2': 8, 'M1': 9, 'both': 10} #file column of each A coefficient
+    _intCols = ['vibrational_final', 'rotational_final', 'vibrational_initial', 'rotational_initial']
+    cols = [
+        'vibrational_final',
+        'rotational_final',
+        'vibrational_initial',
+        'rotational_initial',
+        'wavenumber',
+        'wavenumber_error',
+        'wavelength',
+        'wavelength_error',
+        'einstein_A',
+        'energy_final_cm',
+        'energy_final_error',
+        'energy_final_kelvin',
+        'g_factor_final'
+        ]
+
     def read_file(self):
         """Read linelist from Komasa format."""
-        with open(self.fName, 'r') as f:
-            datLines = []
-            while True:
-                line = f.readline().rstrip('\n')
-                if line:
-                    datLines.append(line.split())
-                else:
-                    break
-        i = input("Select E2 (0), M1 (1) or both (2) lines: ")
-        choose = [8, 9, 10]
-        self.dat = np.array(datLines)[:, [*range(8), choose[int(i)], *range(12,16)]]
-        self.cols = [
-            'vibrational_final',
-            'rotational_final',
-            'vibrational_initial',
-            'rotational_initial',
-            'wavenumber',
-            'wavenumber_error',
-            'wavelength',
-            'wavelength_error',
-            'einstein_A',
-            'energy_final_cm',
-            'energy_final_error',
-            'energy_final_kelvin',
-            'g_factor_final'
-            ]
-        self.typedict = {
-            key: float for key in self.cols
-            }
+        lines = self.opts.get('lines', 'both')
+        if lines not in self._lineCols:
+            raise ValueError("Line selection must be one of E2, M1 or both.")
+        dtype = np.dtype([
+            (col, np.int32 if col in self._intCols else float) for col in self.cols
+            ])
+        usecols = [*range(8), self._lineCols[lines], *range(12,16)]
+        self.dat = _read_columns(self.fName, ncols=16, usecols=usecols, dtype=dtype,
+            keep=self._keep(dict(zip(self.cols, usecols))))
         return self
         
 def detect_filetype(fName):
-    pref, suf = fName.split('.')
-    if suf == 'stick':
-        return stickData
-    elif suf == 'out':
-        return duoOutData
-    elif suf == 'cmg':
-        return cmgData
-    elif suf == 'txt':
-        f = open(fName, 'r')
-        firstLine = f.readline()
-        if len(firstLine.split()) == 2:
-            return xyData
-        elif len(firstLine.split()) == 16:
-            return roueffData
-    else:
-        print("File type not recognised")
+    """Return the registered Data class for a file, see register_reader. At 
+    most the first _sniffBytes_ of the file are read, and the result is cached
+    by the path, size and modification time of the file. For compressed files
+    the compression suffix is ignored and the decompressed bytes are sniffed."""
+    stat = os.stat(fName)
+    ident = (os.path.abspath(fName), stat.st_size, stat.st_mtime_ns)
+    if ident in _detected:
+        return _detected[ident]
+    root, suffix = os.path.splitext(fName)
+    if suffix.lower() in _compressedSuffixes_:
+        root, suffix = os.path.splitext(root)
+    suffix = suffix.lower()
+    head = None
+    for suffixes, sniff, cls in reversed(_readers):
+        if suffixes and suffix not in suffixes:
+            continue
+        if sniff is not None:
+            if head is None:
+                with _open_data(fName) as f:
+                    head = f.read(_sniffBytes_)
+            if not sniff(head):
+                continue
+        _detected[ident] = cls
+        return cls
+    print("File type not recognised")
+
+def read_data(fName, cache=dataCache, **opts):
+    """Detect the type of a data file and return a Data instance holding its
+    parsed contents, with reader options passed to the Data instance. Parsed arrays are taken from the data cache if the file
+    has been read before and is unchanged, otherwise the file is read and the
+    result added to the cache.
+    """
+    fileType = detect_filetype(fName)
+    if fileType is None:
+        return None
+    _Data = fileType(fName, **opts)
+    if not (cache and _Data._cacheable) or opts.get('follow'): #followed files keep changing
+        return _Data.read_file()
+    cached = cache.get(fName, fileType, opts)
+    if cached:
+        return _Data._restore(*cached)
+    _Data.read_file()
+    cache.put(fName, fileType, *_Data._export(), opts=opts)
+    return _Data
+
+def _read_shared(fName, opts):
+    """Process pool worker for read_files. Reads a file and copies its arrays
+    into new shared memory blocks, returning the Data class, a description of
+    each block and the meta data. The parent process attaches to the blocks, 
+    so the arrays are never pickled."""
+    _Data = read_data(fName, **opts)
+    if _Data is None:
+        return None
+    arrays, meta = _Data._export()
+    shared = {}
+    for name, arr in arrays.items():
+        shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        shared[name] = (shm.name, arr.shape, arr.dtype)
+        shm.close()
+    return type(_Data), shared, meta
 
+def _attach_shared(fName, opts, result):
+    """Build a Data instance from the shared memory blocks made by _read_shared.
+    The block names are unlinked straight away, the memory itself lives until
+    the last array using it is deleted, see _SharedArray."""
+    if result is None:
+        return None
+    fileType, shared, meta = result
+    arrays = {}
+    for name, (shmName, shape, dtype) in shared.items():
+        shm = SharedMemory(name=shmName)
+        shm.unlink()
+        arrays[name] = _SharedArray.attach(shm, shape, dtype)
+    return fileType(fName, **opts)._restore(arrays, meta)
+
+class _SharedArray:
+    """Owner of an array in a shared memory block. Arrays handed out by attach
+    have the owner as their base, so the block stays mapped for as long as any
+    array, or view of one, still uses it."""
+    def __init__(self, shm, shape, dtype):
+        self._shm = shm
+        self.__array_interface__ = np.ndarray(shape, dtype=dtype, buffer=shm.buf).__array_interface__
+
+    @classmethod
+    def attach(cls, shm, shape, dtype):
+        return np.asarray(cls(shm, shape, dtype))
+
+def _read_cached(fName, cache=dataCache, **opts):
+    """Resolve a file without reading it, as read_data would from the data cache.
+    Returns a pair of whether the file was resolved and its Data instance, which
+    is None if the file type is not recognised."""
+    if not (cache and cache.enabled) or opts.get('follow'):
+        return False, None
+    fileType = detect_filetype(fName)
+    if fileType is None:
+        return True, None
+    _Data = fileType(fName, **opts)
+    cached = cache.get(fName, fileType, opts) if _Data._cacheable else None
+    if cached:
+        return True, _Data._restore(*cached)
+    return False, None
+
+def read_files(fNames, workers=None, **opts):
+    """Read several data files with read_data, in parallel in a process pool if
+    there is more than one file to parse. Returns a list of Data instances in
+    the same order as fNames. A file that could not be read is returned as the
+    exception that was raised, so one bad file does not stop the others loading.
+    
+    Files in the data cache are restored in this process, keeping their arrays
+    memory-mapped, and only the others are sent to the pool. Followed files are
+    always read in this process, which keeps their position in the file for
+    later reads."""
+    out = [None]*len(fNames)
+    toRead = []
+    for i, fName in enumerate(fNames):
+        try:
+            resolved, out[i] = _read_cached(fName, **opts)
+        except Exception as err:
+            resolved, out[i] = True, err
+        if not resolved:
+            toRead.append(i)
+    if opts.get('follow'):
+        workers = 1
+    if workers is None:
+        workers = min(len(toRead), os.cpu_count() or 1)
+    if workers <= 1 or len(toRead) <= 1:
+        for i in toRead:
+            try:
+                out[i] = read_data(fNames[i], **opts)
+            except Exception as err:
+                out[i] = err
+        return out
+    resource_tracker.ensure_running() #share one tracker with the workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(i, pool.submit(_read_shared, fNames[i], opts)) for i in toRead]
+        for i, future in futures:
+            try:
+                out[i] = _attach_shared(fNames[i], opts, future.result())
+            except Exception as err:
+                out[i] = err
+    return out
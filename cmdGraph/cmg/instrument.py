@@ -0,0 +1,148 @@
+import time
+import functools
+import tracemalloc
+import numpy as np
+
+### Instrumentation Classes
+
+class Instrument:
+    """Opt-in recorder of where the time of a session goes.
+
+    When enabled, the methods below are wrapped in place so that every call is
+    timed, and the wrappers are removed again when disabled, so there is no
+    cost at all while instrumentation is off:
+
+        cmgPrompt.onecmd        wall time, allocated and peak memory per command
+        <Data>.read_file        time per reader class
+        _View.parse             time spent parsing figure arguments
+        _View.apply             time per figure argument setter
+        Figure.draw             time spent drawing figures
+
+    Memory is traced with tracemalloc, which sees numpy arrays as well as Python
+    objects. Files read in a pool of worker processes by read_files are not
+    traced, only the time of the command that read them.
+    """
+    def __init__(self, maxCommands=1000):
+        self.enabled     = False
+        self.maxCommands = maxCommands
+        self.clear()
+        self._patched = [] #(owner, name, original) of wrapped methods
+        self._depth   = 0  #commands run from inside other commands
+
+    def clear(self):
+        """Forget every recorded command and timing."""
+        self.commands = [] #(seconds, allocated bytes, peak bytes, line)
+        self.timings  = {} #name: [calls, seconds]
+
+    def enable(self):
+        """Wrap the instrumented methods and start tracing memory."""
+        if self.enabled:
+            return
+        from matplotlib.figure import Figure
+        from .prompt import cmgPrompt
+        from .view import _View
+        from . import data
+        self._patch(cmgPrompt, 'onecmd', self._command)
+        for cls in vars(data).values():
+            if isinstance(cls, type) and issubclass(cls, data._Data) and 'read_file' in vars(cls):
+                self._patch(cls, 'read_file', self._timer('read_file ' + cls.__name__))
+        self._patch(_View, 'parse', self._timer('parse'))
+        self._patch(_View, 'apply', self._timer(lambda args: 'set --' + args[1]))
+        self._patch(Figure, 'draw', self._timer('draw'))
+        tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        """Restore the original methods and stop tracing memory."""
+        while self._patched:
+            owner, name, original = self._patched.pop()
+            setattr(owner, name, original)
+        tracemalloc.stop()
+        self.enabled = False
+
+    def _patch(self, owner, name, wrap):
+        original = vars(owner)[name]
+        self._patched.append((owner, name, original))
+        setattr(owner, name, functools.wraps(original)(wrap(original)))
+
+    def _timer(self, name):
+        """Return a wrapper that adds the time of each call to timings[name],
+        where name may also be a function of the call arguments."""
+        def wrap(func):
+            def timed(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    key = name(args) if callable(name) else name
+                    timing = self.timings.setdefault(key, [0, 0.])
+                    timing[0] += 1
+                    timing[1] += time.perf_counter() - t0
+            return timed
+        return wrap
+
+    def _command(self, func):
+        """Wrapper of onecmd recording the time and memory of each command,
+        counting commands run by other commands, as by load, as part of them.
+        The stats command itself is not recorded, but a command it profiles is."""
+        def command(prompt, line):
+            if self._depth or line.split()[:1] == ['stats']:
+                return func(prompt, line)
+            self._depth += 1
+            mem0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            t0 = time.perf_counter()
+            try:
+                return func(prompt, line)
+            finally:
+                seconds = time.perf_counter() - t0
+                mem, peak = tracemalloc.get_traced_memory()
+                self._depth -= 1
+                self.commands.append((seconds, mem - mem0, peak - mem0, line.strip()))
+                del self.commands[:-self.maxCommands]
+        return command
+
+    def report(self, plots=(), top=10):
+        """Return a summary of the slowest commands, the time of each stage,
+        and the memory held by the data of each plot, as a string."""
+        mb = lambda nbytes: nbytes/1024**2
+        out = ["Slowest commands:", "{:>10} {:>12} {:>10}  {}".format(
+            "time (s)", "alloc (MB)", "peak (MB)", "command")]
+        for seconds, mem, peak, line in sorted(self.commands, reverse=True)[:top]:
+            out.append("{:>10.4f} {:>12.2f} {:>10.2f}  {}".format(seconds, mb(mem), mb(peak), line))
+        out += ["", "Time by stage:", "{:>10} {:>8}  {}".format("time (s)", "calls", "stage")]
+        for name, (calls, seconds) in sorted(self.timings.items(), key=lambda t: -t[1][1]):
+            out.append("{:>10.4f} {:>8}  {}".format(seconds, calls, name))
+        out += ["", "Memory held by plot data:", "{:>10}  {}".format("MB", "file")]
+        for plot in plots:
+            nbytes, mapped = data_bytes(plot._Data)
+            out.append("{:>10.2f}  {}{}".format(mb(nbytes), plot._Data.fName,
+                " (memory-mapped from cache)" if mapped else ''))
+        return '\n'.join(out)
+
+def data_bytes(_Data):
+    """Return the bytes of array data held by a Data instance, and whether any
+    of it is memory-mapped from the data cache rather than held in memory."""
+    nbytes, mapped = 0, False
+    for arr in _Data._export()[0].values():
+        nbytes += arr.nbytes
+        base = arr
+        while isinstance(base, np.ndarray):
+            mapped |= isinstance(base, np.memmap)
+            base = base.base
+    return nbytes, mapped
+
+def profile(func, *args, fName=None, top=15):
+    """Run func under cProfile, print the top functions by cumulative time and
+    dump the statistics to fName for tools such as snakeviz, if given."""
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        if fName:
+            profiler.dump_stats(fName)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
+
+instrument = Instrument() #shared instance used by the program
@@ -0,0 +1,80 @@
+import time
+import threading
+
+### Background jobs
+
+class Cancelled(BaseException):
+    """Raised inside a background job that has been cancelled. Derived from
+    BaseException, like KeyboardInterrupt, so that it is not caught and reported
+    as an ordinary error by a reader."""
+
+_local = threading.local() #the job running in each thread, if any
+
+def report_progress(nBytes=0, nRows=0):
+    """Add parsed bytes and rows to the progress of the background job running
+    in this thread, if there is one, and raise Cancelled if the job has been
+    cancelled. Readers call this for every chunk, so a job stops within one
+    chunk of being cancelled and never leaves a partly read Data object."""
+    job = getattr(_local, 'job', None)
+    if job is None:
+        return
+    job.bytes += nBytes
+    job.rows  += nRows
+    if job._cancel.is_set():
+        raise Cancelled()
+
+class Job:
+    """A console command running in a background thread.
+
+    The thread runs func(job), and its result is kept until the prompt thread
+    collects the job and calls attach(result), so that the figure is only ever
+    changed from the prompt thread, and only once all of the job's data is
+    ready. A job that runs a subprocess sets its process attribute, so that
+    cancelling the job terminates the process.
+    """
+    def __init__(self, jobId, line, func, attach=None):
+        self.id      = jobId
+        self.line    = line
+        self.attach  = attach
+        self.status  = 'running' #then 'done', 'failed' or 'cancelled'
+        self.bytes   = 0
+        self.rows    = 0
+        self.result  = None
+        self.error   = None
+        self.process = None
+        self.collected = False
+        self._cancel = threading.Event()
+        self._t0 = time.perf_counter()
+        self._t1 = None
+        self._thread = threading.Thread(target=self._run, args=(func,), daemon=True)
+        self._thread.start()
+
+    def _run(self, func):
+        _local.job = self
+        try:
+            self.result = func(self)
+            status = 'done'
+        except Cancelled:
+            status = 'cancelled'
+        except Exception as err:
+            self.error = err
+            status = 'failed'
+        self._t1 = time.perf_counter()
+        self.status = 'cancelled' if self._cancel.is_set() else status
+
+    @property
+    def finished(self):
+        return self.status != 'running'
+
+    def cancel(self):
+        """Ask the job to stop. Its result, if any, is never attached."""
+        self._cancel.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def describe(self):
+        """One line summary of the job and its progress."""
+        elapsed = (self._t1 or time.perf_counter()) - self._t0
+        progress = "{:.1f} MB, {:,} rows".format(self.bytes/1024**2, self.rows) if self.bytes else ''
+        return "[{}] {:<9} {:>7.1f}s  {:<24} {}".format(
+            self.id, self.status, elapsed, progress, self.line)
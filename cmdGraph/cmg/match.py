@@ -0,0 +1,104 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+### Matching Classes
+
+class KeyIndex:
+    """Sorted index of linelist rows on a set of quantum number columns.
+
+    The quantum numbers of each row are doubled and rounded to integers, so
+    that half-integer values such as J compare exactly, and then packed into a
+    single int64 key using the range of each column in the indexed linelist.
+    The keys are sorted once, after which any number of other linelists can be
+    matched against the index with a binary search.
+    """
+    def __init__(self, dat, cols):
+        self.cols = list(cols)
+        quanta = [self._quanta(dat, col) for col in self.cols]
+        self._lo   = [int(q.min(initial=0)) for q in quanta]
+        self._span = [int(q.max(initial=0)) - lo + 1 for q, lo in zip(quanta, self._lo)]
+        if np.prod([float(s) for s in self._span]) >= 2**62:
+            raise ValueError("Quantum numbers span too large a range to pack into one key.")
+        self.size   = len(dat)
+        keys        = self._pack(quanta)
+        self._order = np.argsort(keys, kind='stable')
+        keys        = keys[self._order]
+        # Runs of equal keys in sorted order, as unique keys with start, count
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        self._starts = np.concatenate([[0], bounds]) if len(keys) else bounds
+        self._counts = np.diff(np.append(self._starts, len(keys)))
+        self._unique = keys[self._starts]
+
+    @staticmethod
+    def _quanta(dat, col):
+        """Column of doubled, integer quantum numbers."""
+        return np.rint(2*np.asarray(dat[col], dtype=float)).astype(np.int64)
+
+    def _pack(self, quanta):
+        """Pack quantum number columns into one key per row. Rows with a value
+        outside the range of the indexed linelist can never match, and are given
+        the key -1."""
+        keys = np.zeros(len(quanta[0]) if quanta else 0, dtype=np.int64)
+        valid = np.ones(len(keys), dtype=bool)
+        for q, lo, span in zip(quanta, self._lo, self._span):
+            q = q - lo
+            valid &= (q >= 0) & (q < span)
+            keys *= span
+            keys += q
+        keys[~valid] = -1
+        return keys
+
+    def match(self, dat):
+        """Match the rows of another linelist against the index. Returns a Match
+        holding the index pairs of every matched row, where rows with equal
+        quantum numbers are paired in every combination, as in an inner join.
+        
+        The other linelist's keys are sorted before the binary search, which 
+        keeps the search cache friendly for large linelists."""
+        keys  = self._pack([self._quanta(dat, col) for col in self.cols])
+        order = np.argsort(keys)
+        keys  = keys[order]
+        pos   = np.minimum(np.searchsorted(self._unique, keys), max(len(self._unique) - 1, 0))
+        found = (self._unique[pos] == keys) & (keys >= 0) if len(self._unique) else keys < -1
+        iOther = order[found]
+        pos    = pos[found]
+        counts = self._counts[pos]
+        iOther = np.repeat(iOther, counts)
+        first  = np.repeat(self._starts[pos] - (np.cumsum(counts) - counts), counts)
+        iIndex = self._order[first + np.arange(len(iOther))]
+        return Match(iIndex, iOther, self.size, len(keys), len(pos))
+
+    def match_all(self, dats, workers=None):
+        """Match several other linelists against the index, returning a list
+        of Match in the same order. The index is shared read-only, and numpy 
+        releases the GIL while sorting and searching, so the linelists are 
+        matched in parallel in a pool of threads."""
+        dats = list(dats)
+        workers = min(len(dats), workers or os.cpu_count() or 1)
+        if workers <= 1:
+            return [self.match(dat) for dat in dats]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.match, dats))
+
+class Match:
+    """Index pairs of matched rows between an indexed linelist and another
+    linelist, with statistics of the match."""
+    def __init__(self, iIndex, iOther, nIndex, nOther, nOtherMatched):
+        self.iIndex   = iIndex  #rows of the indexed linelist
+        self.iOther   = iOther  #matching rows of the other linelist
+        self.nIndex   = nIndex
+        self.nOther   = nOther
+        self.nMatched = len(iIndex)
+        self.nOtherMatched = nOtherMatched
+        matched = np.zeros(nIndex, dtype=bool)
+        matched[iIndex] = True
+        self.nIndexMatched = int(matched.sum())
+
+    def summary(self, nameIndex, nameOther):
+        """Return a one line description of the match."""
+        return ("{0} has {1} entries; {2} has {3}. Matched {4} pairs "
+            "({5} of {0}, {6} of {2})").format(
+            nameIndex, self.nIndex, nameOther, self.nOther, self.nMatched,
+            self.nIndexMatched, self.nOtherMatched
+            )
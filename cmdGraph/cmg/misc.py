@@ -0,0 +1,70 @@
+import numpy as np
+
+### Level of detail functions
+
+def minmax_decimate(x, y, xmin, xmax, nBins):
+    """Reduce sorted x, y line data to at most four points per bin, for nBins
+    equal bins between xmin and xmax. Each bin keeps its first and last points
+    and the minimum and maximum y value, placed at the centre of the bin, so
+    that a line drawn through the reduced data covers the same pixels as one
+    drawn through the full data when each bin is one pixel column wide.
+
+    Points outside [xmin, xmax] are added to the first or last bin, so the line
+    still runs off the edges of the view.
+    """
+    if len(x) <= 4*nBins or xmax <= xmin:
+        return x, y
+    bins = ((x - xmin)*(nBins/(xmax - xmin))).astype(np.int64)
+    np.clip(bins, 0, nBins - 1, out=bins)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+    ends   = np.append(starts[1:], len(x)) - 1
+    mid    = xmin + (bins[starts] + 0.5)*((xmax - xmin)/nBins)
+    xOut = np.empty((len(starts), 4), dtype=x.dtype)
+    yOut = np.empty((len(starts), 4), dtype=y.dtype)
+    xOut[:, 0], yOut[:, 0] = x[starts], y[starts]
+    xOut[:, 1], yOut[:, 1] = mid, np.minimum.reduceat(y, starts)
+    xOut[:, 2], yOut[:, 2] = mid, np.maximum.reduceat(y, starts)
+    xOut[:, 3], yOut[:, 3] = x[ends], y[ends]
+    return xOut.ravel(), yOut.ravel()
+
+def bin_sticks(x, height, xmin, xmax, nBins, how='max'):
+    """Aggregate sorted stick positions x and heights into nBins equal bins
+    between xmin and xmax, one stick per occupied bin placed at the bin centre.
+    The stick height is the tallest in the bin if how is 'max', or the sum of
+    the bin's heights if how is 'sum'.
+    """
+    if len(x) <= nBins or xmax <= xmin:
+        return x, height
+    bins = ((x - xmin)*(nBins/(xmax - xmin))).astype(np.int64)
+    np.clip(bins, 0, nBins - 1, out=bins)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+    reduce = np.add if how == 'sum' else np.maximum
+    return xmin + (bins[starts] + 0.5)*((xmax - xmin)/nBins), reduce.reduceat(height, starts)
+
+### Viewport functions
+
+def viewport_window(xmin, xmax, margin=0.5):
+    """Return the x range of data to give artists for the visible range xmin
+    to xmax, which is widened on each side by margin times its width so that
+    small pans need no new data."""
+    pad = (xmax - xmin)*margin
+    return xmin - pad, xmax + pad
+
+def window_covers(window, xmin, xmax, maxZoom=4.):
+    """Is the visible range xmin to xmax inside a window of data made by 
+    viewport_window, which is not more than maxZoom times wider than the range?
+    A window that is much wider than the view, after zooming in, is replaced
+    so that the artists only get the data they need."""
+    return (window is not None and window[0] <= xmin and xmax <= window[1]
+        and window[1] - window[0] <= maxZoom*(xmax - xmin))
+
+### Stick functions
+
+def stick_segments(x, height, base):
+    """Return an (N, 2, 2) array of line segments for sticks at positions x,
+    drawn from y = base to y = height. Always double precision."""
+    segs = np.empty((len(x), 2, 2))
+    segs[:, :, 0] = x[:, None]
+    segs[:, 0, 1] = base
+    segs[:, 1, 1] = height
+    return segs
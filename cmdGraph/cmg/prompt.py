@@ -1,13 +1,73 @@
 import cmd #for program commands
 import argparse #for figure arguments
 import numpy as np #for... need I explain?
-import matplotlib #urm... seems kinda obvious
-import matplotlib.pyplot as plt #convenience
 import sys
 import os
+import shutil
+import shlex
+import subprocess
+import tempfile
 
-from .data import xyData, stickData, cmgData, duoOutData, roueffData, detect_filetype
-from .view import GraphView, StickView, linelistComparisonView
+from .data import xyData, stickData, cmgData, cmgzData, duoOutData, roueffData, detect_filetype, read_data, read_files
+from .cache import dataCache
+from .store import dataStore
+from .instrument import instrument, profile
+from .jobs import Job, report_progress
+
+# matplotlib and the View classes are slow to import, so they are only
+# imported by _pyplot when the first figure is needed.
+
+def _pyplot(interactive=True, usetex=None):
+    """Import pyplot, apply the cmdGraph figure style and, if interactive, turn
+    on interactive mode. Returns the pyplot module.
+
+    TeX fragments rendered by matplotlib are cached in the 'tex' directory of
+    the cmdGraph cache, keyed by matplotlib on the TeX source, font preamble and
+    dpi, so they are shared between sessions and batch rendering workers."""
+    import matplotlib.pyplot as plt #convenience
+    if not getattr(_pyplot, '_ready', False):
+        from matplotlib.texmanager import TexManager
+        from pathlib import Path
+        if hasattr(TexManager, '_cache_dir'):
+            TexManager._cache_dir = Path(dataCache.directory, 'tex')
+        plt.rc('text', usetex=_latex_available() if usetex is None else usetex)
+        plt.rc('font', family='serif')
+        if interactive:
+            plt.ion()
+        _pyplot._ready = True
+    return plt
+
+def _latex_available():
+    """Is a LaTeX installation available for matplotlib's usetex mode?"""
+    return shutil.which('latex') is not None
+
+### Console command parsers
+
+def _adat_parser():
+    """Build the argparse parser for the options and files given to adat. Every
+    option is passed to the reader of each file as a keyword argument, options
+    that are not given are left out so the reader can use its own default."""
+    parser = argparse.ArgumentParser(prog='adat', add_help=False)
+    parser.add_argument('--precision', choices=['single', 'double'],
+        default=argparse.SUPPRESS,
+        help="floating point precision of stored stick data")
+    parser.add_argument('--usecols', type=str, metavar='col1,col2,...',
+        default=argparse.SUPPRESS,
+        help="comma separated list of linelist columns to load")
+    parser.add_argument('--lines', choices=['E2', 'M1', 'both'],
+        default=argparse.SUPPRESS,
+        help="Einstein A coefficients to load from Roueff format linelists")
+    parser.add_argument('--where', nargs=3, action='append', metavar=('col', 'min', 'max'),
+        default=argparse.SUPPRESS,
+        help="only load rows with col between min and max, '*' for no bound")
+    parser.add_argument('--min-intensity', type=str, metavar='float',
+        default=argparse.SUPPRESS,
+        help="only load lines with at least this intensity")
+    parser.add_argument('--follow', action='store_true',
+        default=argparse.SUPPRESS,
+        help="keep reading rows appended to the files while they grow")
+    parser.add_argument('files', nargs='+')
+    return parser
 
 ### User interface object
 
@@ -23,34 +83,51 @@ class cmgPrompt(cmd.Cmd):
     """
     prompt = '> ' #set left hand icon for prompt
 
-    def __init__(self, mode='launch', **kwargs):
+    def __init__(self, mode='launch', interactive=True, **kwargs):
         """Initialise a new prompt mode. 
         
-        Creates a figure and sets the View object and Data type specified by the 
-        'mode' keyword argument. The default value is 'launch', which is used 
-        when the program starts to call the Cmd superclass __init__ function. 
-        Other keyword arguments are passed to the Cmd superclass.
+        Sets the View object and Data type specified by the 'mode' keyword
+        argument. The default value is 'launch', which is used when the program
+        starts to call the Cmd superclass __init__ function. With interactive
+        False, as for batch rendering, figures are never shown. Other keyword 
+        arguments are passed to the Cmd superclass. The figure and View instance
+        are only created when first used, see _View.
         """
-        plt.rc('text', usetex=True)
-        plt.rc('font', family='serif')
-        plt.ion()
         self._modes = ['graph', 'stick', 'linelistComparison'] #define available modes
+        self._adatParser = _adat_parser()
         if mode == 'launch': #for first __init__
             cmd.Cmd.__init__(self, **kwargs)
+            self._interactive = interactive
+            self._tex = 'draft' if interactive else 'on' #see do_tex
+            self._preloaded = {} #Data read ahead of adat, by (file, options)
+            self._loading = False #running a loaded file, preloaded Data is kept until it ends
+            self._batch = 0 #depth of nested begin/commit transactions
+            self.errors = [] #messages for files that could not be read
+            self._jobs = [] #background jobs, see do_bg
+            self._jobTimer = None #(timer, figure) collecting finished jobs
+            self._figures = {} #figure number: View of every other open figure, see do_figure
             mode = 'graph' #default to graph
         if mode in self._modes:
             self.mode = mode
-            self.fig = plt.figure()
+            self._view = None
             self._single = False
-            if mode == 'graph':
-                self._View = GraphView(self.fig) #set the view mode
-            elif mode == 'stick':
-                self._View = StickView(self.fig)
-            elif mode == 'linelistComparison':
-                self._View = linelistComparisonView(self.fig)
         else:
             print("Mode not defined.")
 
+    @property
+    def _View(self):
+        """The View instance of the current mode. The figure and View are
+        created the first time they are needed."""
+        if self._view is None:
+            plt = _pyplot(self._interactive)
+            plt.rc('text', usetex=self._usetex())
+            from .view import viewModes
+            self.fig = plt.figure()
+            self._view = viewModes[self.mode](self.fig) #set the view mode
+            self._view.deferred = self._batch > 0 #mode changed in a transaction
+            self._view.preloaded = self._preloaded #data of figure commands in bundles
+        return self._view
+
     def onecmd(self, line):
         """Overwritten from default cmd.onecmd method to prevent exiting command
         loop when an error is raised.
@@ -73,6 +150,12 @@ class cmgPrompt(cmd.Cmd):
             except AttributeError:
                 return self.default(line)
 
+    def precmd(self, line):
+        """Attach the results of finished background jobs before running the
+        next command, so the command sees the plots they added."""
+        self._collect_jobs()
+        return line
+
     ## Command methods ##
     def default(self, line):
         """Pass input string to the View instance's argparse parser if the string
@@ -81,7 +164,11 @@ class cmgPrompt(cmd.Cmd):
         
         """
         argIn = line.split(' ') #argparse expects list of arguments
-        hasParsed = self._View.parse(argIn)
+        self.do_begin('') #draw once for all arguments in the line
+        try:
+            hasParsed = self._View.parse(argIn)
+        finally:
+            self.do_commit('')
         if not hasParsed: #unrecognised argparse argument
             print("Unrecognised argument.")
         else:
@@ -115,14 +202,80 @@ class cmgPrompt(cmd.Cmd):
         file using the active data mode. Requires that self._Data has been set 
         to a valid Data class by __init__. Then adds Data to the View instance as
         as plot.
+
+        Multiple files are read in parallel, and plots are added in the order
+        the files were given. A file that fails to load is reported and skipped.
+        Files already read ahead by do_load are not read again.
         
         """
-        for inFile in inp.split(): #assume spaces in input delimit files
-            fileType = detect_filetype(inFile) #detect data type
-            _Data = fileType(inFile).read_file() #read input file and return data object
-            self._View.add_plot(_Data) #call view mode add plot function
+        args = self._parse_adat(inp)
+        if args is None:
+            return
+        inFiles = args.pop('files')
+        self.do_begin('')
+        try:
+            self._add_files(inFiles, args)
+        finally:
+            self.do_commit('')
+
+    def _add_files(self, inFiles, args):
+        """Read files with reader options args, and add them as plots. A file
+        given more than once is read once, and its plots share the Data."""
+        key = lambda inFile: (inFile, repr(sorted(args.items())))
+        toRead = [inFile for inFile in dict.fromkeys(inFiles) if key(inFile) not in self._preloaded]
+        self._preloaded.update(zip(map(key, toRead), dataStore.read_files(toRead, **args)))
+        for inFile in inFiles:
+            _Data = self._preloaded.get(key(inFile)) #detected, read Data object
+            if isinstance(_Data, Exception):
+                self.errors.append("Could not read '{}': {}".format(inFile, _Data))
+                print(self.errors[-1])
+            elif _Data is not None:
+                self._View.add_plot(_Data) #call view mode add plot function
+                dataStore.acquire(_Data)
+                if args.get('follow') and not self._View.follow(self._View.plots[-1]):
+                    print("Can not follow '{}' in {} mode.".format(inFile, self.mode))
+        if not self._loading: #a loaded file may use the Data again, as for --compare
+            for inFile in inFiles:
+                self._preloaded.pop(key(inFile), None)
+
+    def _parse_adat(self, inp):
+        """Parse adat input into a dictionary of reader options and a list of
+        files under 'files', or return None if the input is not valid. Quotes
+        may group option values, as in --where "wavenumber 1000 2000", but 
+        spaces always delimit values and files."""
+        try: #catch argparse system exit
+            return vars(self._adatParser.parse_args(' '.join(shlex.split(inp)).split()))
+        except (SystemExit, ValueError): #ValueError from unbalanced quotes
+            return None
     def help_adat(self):
-        print("usage: adat <file1> <file2> ... \n    Add lines(s) to figure from file(s). ")
+        print("usage: adat [--precision single|double] [--usecols col1,col2,...] [--lines E2|M1|both]\n"
+              "            [--where col min max] [--min-intensity float] [--follow] <file1> <file2> ... \n"
+              "    Add lines(s) to figure from file(s), options apply to every file.\n"
+              "    --where (repeatable) and --min-intensity load only the selected rows of each file.\n"
+              "    With --follow, rows appended to x-y and stick files are added as they are written.")
+
+    def do_cache(self, inp):
+        """Control the on-disk cache of parsed data files. With no argument,
+        print the cache location and size. 'on' and 'off' enable and disable
+        the cache, 'clear' removes all entries and 'size <MB>' sets the cap.
+
+        """
+        args = inp.split()
+        if not args:
+            print("Cache {} at '{}', using {:.1f} of {:.1f} MB.".format(
+                'enabled' if dataCache.enabled else 'disabled', dataCache.directory,
+                dataCache.size()/1024**2, dataCache.maxBytes/1024**2))
+        elif args[0] in ['on', 'off']:
+            dataCache.enabled = args[0] == 'on'
+        elif args[0] == 'clear':
+            dataCache.clear()
+        elif args[0] == 'size' and len(args) == 2:
+            dataCache.maxBytes = int(float(args[1])*1024**2)
+            dataCache.evict()
+        else:
+            print("Cache option not recognised.")
+    def help_cache(self):
+        print("usage: cache [on|off|clear|size <MB>]\n    Show or control the cache of parsed data files.")
 
     def do_ddat(self, inp):
         """Remove a data file from the figure. Not working yet, placeholder only.
@@ -131,6 +284,7 @@ class cmgPrompt(cmd.Cmd):
         for plot in self._View.plots:
             if plot._Data.fName == inp:
                 self._View.plots.remove(plot)
+                dataStore.release(plot._Data)
     def help_ddat(self):
         print("usage: ddat <file>\n    Placeholder.")
 
@@ -159,22 +313,147 @@ class cmgPrompt(cmd.Cmd):
         """Set the current plotting mode. Calls the cmdPrompt __init__ method
         to initialise a new View instance and change the data mode. Closes current
         figure (without saving) and opens new figure for the input View mode.
+
+        The data of the closed figure stays in the session data store, so adding
+        the same files in the new mode does not read them again. Other figures
+        opened with 'figure new' are left open.
         
         """
         if inp in self._modes:
-            plt.close(fig='all')
+            if self._view is not None:
+                self._close_view(self._view)
             self.__init__(mode=inp)
         else:
             print("Mode not defined.")
     def help_mode(self):
         print("usage: mode <mode>\n    Change figure mode (graph, stick)")
 
+    def _close_view(self, view):
+        """Close the figure of a View and release the stored data of its plots,
+        and any data held by the View itself."""
+        for plot in view.plots:
+            dataStore.release(plot._Data)
+        for _Data in view.held_data():
+            dataStore.release(_Data)
+        if view._followTimer is not None:
+            view._followTimer.stop()
+        _pyplot(self._interactive).close(view.fig)
+
+    def do_figure(self, inp):
+        """Keep several figures open at once. With no argument, list the open
+        figures. 'new [mode]' opens a new figure, in the current mode by default,
+        leaving the current figure open, '<number>' makes an open figure current,
+        and 'close [<number>]' closes a figure, by default the current one. All
+        figures share the session data store, so a file plotted in one figure is
+        added to another without being read again.
+
+        """
+        self._prune_figures()
+        args = inp.split()
+        if not args:
+            views = dict(self._figures)
+            if self._view is not None:
+                views[self.fig.number] = self._view
+            if not views:
+                print("No open figures.")
+            for number, view in sorted(views.items()):
+                print("{} {:>3}  {:<20} {} plots".format('*' if view is self._view else ' ',
+                    number, view.mode, len(view.plots)))
+        elif args[0] == 'new' and len(args) < 3:
+            mode = args[1] if len(args) == 2 else self.mode
+            if mode not in self._modes:
+                print("Mode not defined.")
+                return
+            self._park_view()
+            self.__init__(mode=mode)
+        elif args[0] == 'close' and len(args) < 3:
+            number = int(args[1]) if len(args) == 2 and args[1].isdigit() else None
+            if number is None or (self._view is not None and number == self.fig.number):
+                self.do_mode(self.mode) #fresh figure in the same mode
+            elif number in self._figures:
+                self._close_view(self._figures.pop(number))
+            else:
+                print("No figure {}.".format(args[1]))
+        elif args[0].isdigit() and len(args) == 1:
+            number = int(args[0])
+            if self._view is not None and number == self.fig.number:
+                return
+            if number not in self._figures:
+                print("No figure {}.".format(number))
+                return
+            view = self._figures.pop(number)
+            self._park_view()
+            self.__init__(mode=view.mode)
+            self._view, self.fig = view, view.fig
+            self._view.deferred = self._batch > 0
+            _pyplot(self._interactive).figure(number) #make current for new plots, and raise its window
+        else:
+            print("Figure option not recognised.")
+    def help_figure(self):
+        print("usage: figure [new [<mode>]|<number>|close [<number>]]\n"
+              "    List, open, switch between or close figures, which share their data.")
+
+    def _close_figures(self):
+        """Close every figure of the prompt, releasing the stored data of their
+        plots, as when a batch render is done with the prompt."""
+        for number in list(self._figures):
+            self._close_view(self._figures.pop(number))
+        if self._view is not None:
+            self._close_view(self._view)
+            self._view = None
+
+    def _park_view(self):
+        """Keep the current View open among the other figures, leaving single
+        plot mode first."""
+        if self._view is None:
+            return
+        if self._single:
+            self.do_exit('')
+        if self._batch:
+            self._view.flush() #draw changes made in an open transaction
+        self._figures[self.fig.number] = self._view
+
+    def _prune_figures(self):
+        """Forget figures whose windows have been closed, releasing their data."""
+        plt = _pyplot(self._interactive)
+        for number in [n for n in self._figures if not plt.fignum_exists(n)]:
+            self._close_view(self._figures.pop(number))
+
+    def do_store(self, inp):
+        """Control the session store of parsed data, shared by every mode and
+        figure. With no argument, print the number of stored files and their
+        memory. 'size <MB>' sets the memory budget, above which data no plot
+        uses is dropped, least recently used first, and 'clear' drops all data
+        no plot uses.
+
+        """
+        args = inp.split()
+        if not args:
+            nEntries, nUsed, nbytes = dataStore.stats()
+            print("Data store holds {} files ({} plotted), using {:.1f} of {:.1f} MB.".format(
+                nEntries, nUsed, nbytes/1024**2, dataStore.maxBytes/1024**2))
+        elif args[0] == 'clear':
+            dataStore.clear()
+        elif args[0] == 'size' and len(args) == 2:
+            dataStore.maxBytes = int(float(args[1])*1024**2)
+            dataStore.evict()
+        else:
+            print("Store option not recognised.")
+    def help_store(self):
+        print("usage: store [clear|size <MB>]\n    Show or control the session store of parsed data.")
+
     def do_save(self, inp):
         """Save configuration for current figure in a native cmdGraph 'save file'.
         This is done by initialising an instance o the cmdGraph data class and
         calling it's write file method for the current View instance.
+
+        A file name ending in '.cmgz' saves a bundle holding the parsed data 
+        of every plot as well, see cmgzData. With 'compress' after the name
+        the data in the bundle is compressed.
         
         """
+        args = inp.split()
+        inp, compress = (args[0], args[1:] == ['compress']) if args else ('', False)
         if not inp:
             if not hasattr(self, '_savefile'):
                 i = 1
@@ -182,31 +461,138 @@ class cmgPrompt(cmd.Cmd):
                     i +=1
                 self._savefile = "autosave{0}.cmg".format(i)
             inp = self._savefile
-        cmgData(inp).write_file(self._View)
+        if inp.endswith('.cmgz'):
+            cmgzData(inp, compress=compress).write_file(self._View)
+        else:
+            cmgData(inp).write_file(self._View)
         self._changed = False
         self._savefile = inp
     def help_save(self):
-        print("usage: save <filename>\n    Save the current figure as <filename>.cmg, allows figures to be reload after exit.")
+        print("usage: save <filename> [compress]\n    Save the current figure as <filename>.cmg, allows figures to be reload after exit.\n"
+              "    Saving as <filename>.cmgz bundles the data with the figure, optionally compressed.")
 
     def do_load(self, inp):
         """Load a View instance from a cmdGraph 'save file' by initialising a
-        cmdGraph data instance and calling it's read file method. Then pass
-        each item in the data attribute as though it were a user command.
+        cmdGraph data instance and calling it's read file method, then running
+        each command in the file.
+
+        Every data file added by the configuration is read up front, in 
+        parallel, before the commands are run. For a '.cmgz' bundle the data
+        is instead mapped from the bundle, and no data files are read.
         """
-        buff = cmgData(inp).read_file()
-        for cmdString in buff.dat:
-            self.onecmd(cmdString)
-        if self._single:
-            self.do_exit('')
+        loaded = self._read_load(inp)
+        if loaded is None:
+            return
+        cmdStrings, preloaded = loaded
+        self._preloaded.update(preloaded)
+        self._preload(cmdStrings)
+        self._apply_load(cmdStrings)
         self._savefile = inp
+
+    def _read_load(self, inp):
+        """Read a '.cmg' file or bundle for do_load. Returns its commands and 
+        the Data mapped from a bundle by (file, options key), or None if the
+        file could not be read."""
+        bundle = inp.endswith('.cmgz')
+        buff = (cmgzData if bundle else cmgData)(inp).read_file()
+        if buff.dat is None:
+            return None
+        preloaded = {
+            (_Data.fName, repr(sorted(_Data.opts.items()))): _Data for _Data in buff.data()
+            } if bundle else {}
+        return buff.dat, preloaded
+
+    def _apply_load(self, cmdStrings):
+        """Run the commands of a loaded file, with its data preloaded. The
+        preloaded Data is kept until every command has run, so that a file both
+        plotted and compared to is found by each command that uses it."""
+        self.do_begin('') #draw once, when the whole figure is built
+        self._loading = True
+        try:
+            for cmdString in cmdStrings:
+                self.onecmd(cmdString)
+            if self._single:
+                self.do_exit('')
+        finally:
+            self._loading = False
+            self._preloaded.clear()
+            self.do_commit('')
+
+    def _preload(self, cmdStrings, preloaded=None, workers=None):
+        """Read the files of every adat command in one parallel batch per set
+        of reader options into preloaded, by default self._preloaded, ready for 
+        do_adat to use. Files already in preloaded are not read again."""
+        preloaded = self._preloaded if preloaded is None else preloaded
+        batches = {}
+        for cmdString in cmdStrings:
+            command, arg, line = self.parseline(cmdString)
+            args = self._parse_adat(arg) if command == 'adat' else None
+            if args:
+                inFiles = args.pop('files')
+                batches.setdefault(repr(sorted(args.items())), (args, []))[1].extend(inFiles)
+        for optKey, (args, inFiles) in batches.items():
+            inFiles = [
+                inFile for inFile in dict.fromkeys(inFiles) if (inFile, optKey) not in preloaded
+                ] #not already mapped from a bundle
+            preloaded.update(zip(
+                [(inFile, optKey) for inFile in inFiles], dataStore.read_files(inFiles, workers, **args)
+                ))
+        return preloaded
     def help_load(self):
-        print("usage: load <filename>.cmg\n    Load figure from cmdGraph file.")
+        print("usage: load <filename>.cmg|<filename>.cmgz\n    Load figure from cmdGraph file or bundle.")
+
+    def do_begin(self, inp):
+        """Start a transaction. Until the matching commit, figure changes are
+        not drawn and legend rebuilds are queued, so that a series of commands
+        costs a single redraw. Transactions may be nested, only the outermost
+        commit draws. load, adat and figure command lines are automatically
+        run in a transaction.
+        """
+        if self._batch == 0:
+            plt = _pyplot(self._interactive)
+            self._wasInteractive = plt.isinteractive()
+            plt.ioff() #no automatic redraws
+            self._View.deferred = True
+        self._batch += 1
+    def help_begin(self):
+        print("usage: begin\n    Start a transaction, changes are drawn at the matching commit.")
+
+    def do_commit(self, inp):
+        """End a transaction started by begin. For the outermost transaction,
+        apply queued legend changes and redraw the figure once."""
+        if not self._batch:
+            print("No transaction to commit.")
+            return
+        self._batch -= 1
+        if self._batch == 0:
+            self._View.flush()
+            if self._wasInteractive:
+                _pyplot(self._interactive).ion()
+    def help_commit(self):
+        print("usage: commit\n    End a transaction and draw all changes at once.")
 
     def do_print(self, inp):
-        """Rudimentary print figure to file. Redirects to plt.savefig(), the
+        """Rudimentary print figure to file. Redirects to fig.savefig(), the
         filetpye is automatically chosen from the suffix used in the input
         string, i.e '.pdf', '.jpg'.
+
+        In 'draft' TeX mode the figure's text is switched to LaTeX for the
+        duration of the print only.
         """
+        inp = self._print_name(inp)
+        fig = self._View.fig
+        if self._usetex(printing=True) and not self._usetex():
+            with _pyplot(self._interactive).rc_context({'text.usetex': True}):
+                restore = self._set_usetex(True)
+                try:
+                    fig.savefig(inp)
+                finally:
+                    for text, usetex in restore:
+                        text.set_usetex(usetex)
+        else:
+            fig.savefig(inp)
+    def _print_name(self, inp):
+        """The file to print to, by default the next free 'autoprint' file."""
         if not inp:
             if not hasattr(self, '_printfile'):
                 i = 1
@@ -214,13 +600,232 @@ class cmgPrompt(cmd.Cmd):
                     i +=1
                 self._printfile = "autoprint{0}.pdf".format(i)
             inp = self._printfile
-        plt.savefig(inp)
+        return inp
     def help_print(self):
         print("usage print <filename>.<filetype>\n    Print figure to file.")
 
+    def do_bg(self, inp):
+        """Run an adat, load or print command as a background job, so that the
+        prompt and figure stay responsive while it runs. Files are read in a
+        background thread, one after another so the job can report its progress
+        and be cancelled between chunks. The plots are only added to the figure,
+        on the prompt thread, once all the data of the command has been read:
+        before the next command, or from a timer of the figure window while the 
+        prompt is idle. A print takes a snapshot of the figure as it is now,
+        with its axis ranges and TeX mode, then writes it to a bundle and renders
+        it in a separate process, both in the background.
+
+        """
+        command, arg, line = self.parseline(inp)
+        starters = {'adat': self._bg_adat, 'load': self._bg_load, 'print': self._bg_print}
+        if command not in starters:
+            print("Only adat, load and print can run in the background.")
+            return
+        job = starters[command](arg)
+        if job is not None:
+            print("[{}] {}".format(job.id, line))
+    def help_bg(self):
+        print("usage: bg adat|load|print <arguments>\n"
+              "    Run a command in the background, see 'jobs' and 'cancel'.")
+
+    def _bg_adat(self, inp):
+        args = self._parse_adat(inp)
+        if args is None:
+            print("Unrecognised argument.")
+            return None
+        inFiles = args.pop('files')
+        self._View #open the figure window the plots will be added to
+        optKey = repr(sorted(args.items()))
+        def read(job):
+            return dict(zip(
+                [(inFile, optKey) for inFile in inFiles], dataStore.read_files(inFiles, 1, **args)
+                ))
+        def attach(preloaded):
+            self._preloaded.update(preloaded)
+            self.do_begin('')
+            try:
+                self._add_files(inFiles, args)
+            finally:
+                self.do_commit('')
+        return self._start_job('adat ' + inp, read, attach)
+
+    def _bg_load(self, inp):
+        loaded = self._read_load(inp)
+        if loaded is None:
+            return None
+        cmdStrings, preloaded = loaded
+        def attach(preloaded):
+            self._preloaded.update(preloaded)
+            self._apply_load(cmdStrings)
+        return self._start_job('load ' + inp, 
+            lambda job: self._preload(cmdStrings, preloaded, workers=1), attach)
+
+    def _bg_print(self, inp):
+        outFile = os.path.abspath(self._print_name(inp))
+        base, ext = os.path.splitext(os.path.basename(outFile))
+        tmpDir = tempfile.mkdtemp(prefix='cmdGraph-')
+        bundle = os.path.join(tmpDir, base + '.cmgz')
+        ax = self._View.ax
+        snapshot = cmgzData(bundle).snapshot(self._View, extra=[
+            '--xrange {!r} {!r}'.format(*map(float, ax.get_xlim())),
+            '--yrange {!r} {!r}'.format(*map(float, ax.get_ylim())),
+            'tex ' + self._tex,
+            ]) #the figure as it is now, with its live pan, zoom and TeX mode
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            filter(None, [root, os.environ.get('PYTHONPATH')])))
+        def render(job):
+            try:
+                cmgzData(bundle).write_snapshot(snapshot)
+                report_progress() #stop here if cancelled while writing
+                job.process = subprocess.Popen([sys.executable, '-m', 'cmdGraph', 'render', 
+                    bundle, '--out-dir', tmpDir, '--format', ext.lstrip('.') or 'pdf', '--jobs', '1'],
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, text=True)
+                out = job.process.communicate()[0]
+                if job.process.returncode:
+                    errors = [line.strip() for line in out.splitlines() if line.startswith('    ')]
+                    raise RuntimeError(errors[-1] if errors else "Render failed.")
+                shutil.move(os.path.join(tmpDir, base + (ext or '.pdf')), outFile)
+            finally:
+                shutil.rmtree(tmpDir, ignore_errors=True)
+        return self._start_job('print ' + inp, render)
+
+    def _start_job(self, line, func, attach=None):
+        """Start a background job and, in an interactive session with a figure
+        window, a timer of the window that collects the job when it finishes."""
+        job = Job(len(self._jobs) + 1, line.strip(), func, attach)
+        self._jobs.append(job)
+        if self._interactive and self._view is not None:
+            timer, fig = self._jobTimer or (None, None)
+            if fig is None or not _pyplot(self._interactive).fignum_exists(fig.number):
+                timer = self._View.fig.canvas.new_timer(interval=250)
+                timer.add_callback(self._collect_jobs, True)
+                timer.start()
+                self._jobTimer = (timer, self._View.fig)
+        return job
+
+    def _collect_jobs(self, idle=False):
+        """Report every finished job that has not been collected yet, and 
+        attach the results of completed ones. Always runs on the prompt thread,
+        with idle True when called by the timer while the prompt waits for input."""
+        collected = False
+        for job in self._jobs:
+            if not job.finished or job.collected:
+                continue
+            job.collected = True
+            if job.status == 'done' and job.attach is not None:
+                try:
+                    job.attach(job.result)
+                except Exception as err:
+                    job.status, job.error = 'failed', err
+            message = {'done': "Done", 'cancelled': "Cancelled",
+                'failed': "Failed: {}".format(job.error)}[job.status]
+            print("{}[{}] {} {}".format('\n' if idle else '', job.id, message, job.line))
+            collected = True
+        if collected and idle:
+            sys.stdout.write(self.prompt) #the prompt line was overwritten
+            sys.stdout.flush()
+        if self._jobTimer and all(job.collected for job in self._jobs):
+            self._jobTimer[0].stop()
+            self._jobTimer = None
+
+    def do_jobs(self, inp):
+        """List the background jobs of the session, with the time they have
+        run, and the bytes parsed and rows read by those reading files."""
+        self._collect_jobs()
+        if not self._jobs:
+            print("No background jobs.")
+        for job in self._jobs:
+            print(job.describe())
+    def help_jobs(self):
+        print("usage: jobs\n    List background jobs and their progress.")
+
+    def do_cancel(self, inp):
+        """Cancel a running background job. Readers stop at their next chunk,
+        a print's render process is terminated, and nothing is added to the
+        figure."""
+        job = next((job for job in self._jobs if str(job.id) == inp.strip()), None)
+        if job is None:
+            print("No job '{}'.".format(inp.strip()))
+        elif job.finished:
+            print("Job [{}] has already finished.".format(job.id))
+        else:
+            job.cancel()
+    def help_cancel(self):
+        print("usage: cancel <job>\n    Cancel a background job, see 'jobs'.")
+
+    def do_stats(self, inp):
+        """Show where the time of the session has gone. 'on' starts recording
+        the time and memory of every command, file read, figure argument and
+        draw, 'off' stops, and 'clear' forgets what has been recorded. With 
+        'profile [<file>.prof] <command>' the command is run under cProfile,
+        and the profile saved to the file if one is given.
+
+        """
+        args = inp.split()
+        if not args:
+            if not (instrument.enabled or instrument.commands):
+                print("Nothing recorded, start recording with 'stats on'.")
+                return
+            print(instrument.report(self._view.plots if self._view else []))
+        elif args[0] == 'on':
+            instrument.enable()
+        elif args[0] == 'off':
+            instrument.disable()
+        elif args[0] == 'clear':
+            instrument.clear()
+        elif args[0] == 'profile' and len(args) > 1:
+            fName = args[1] if args[1].endswith('.prof') else None
+            line = inp.split(None, 2 if fName else 1)[-1]
+            if line == fName:
+                print("No command to profile.")
+                return
+            profile(self.onecmd, line, fName=fName)
+        else:
+            print("Stats option not recognised.")
+    def help_stats(self):
+        print("usage: stats [on|off|clear|profile [<file>.prof] <command>]\n"
+              "    Show the slowest commands, time spent by stage and memory per plot.")
+
+    def do_tex(self, inp):
+        """Choose how figure text is typeset. 'on' always uses LaTeX, 'off'
+        always uses matplotlib's mathtext, and 'draft' (the default for the 
+        interactive prompt) uses mathtext on screen and LaTeX only when printing.
+        Without a LaTeX installation mathtext is always used.
+        """
+        if not inp:
+            print("TeX mode is '{}'{}.".format(
+                self._tex, '' if _latex_available() else ', LaTeX not found so mathtext is used'))
+            return
+        if inp not in ['on', 'off', 'draft']:
+            print("TeX mode not recognised.")
+            return
+        self._tex = inp
+        if self._view is not None:
+            _pyplot(self._interactive).rc('text', usetex=self._usetex())
+            self._set_usetex(self._usetex())
+            self._View.fig.canvas.draw_idle()
+    def help_tex(self):
+        print("usage: tex [on|off|draft]\n    Typeset text with LaTeX always, never, or only when printing.")
+
+    def _usetex(self, printing=False):
+        """Should figure text be typeset with LaTeX, on screen or when printing?"""
+        if not _latex_available():
+            return False
+        return self._tex == 'on' or (printing and self._tex == 'draft')
+
+    def _set_usetex(self, usetex):
+        """Set LaTeX typesetting of every text in the current figure, returning
+        a list of (text, previous setting) pairs."""
+        from matplotlib.text import Text
+        restore = [(text, text.get_usetex()) for text in self._View.fig.findobj(Text)]
+        for text, _ in restore:
+            text.set_usetex(usetex)
+        return restore
+
     def do_tight(self, inp):
         """Apply matplotlib tight_layout."""
-        plt.tight_layout()
+        self._View.fig.tight_layout()
     def help_tight(self):
         print("usage: tight\n    Apply tight layout.")
 
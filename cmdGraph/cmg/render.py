@@ -0,0 +1,131 @@
+import os
+import io
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+### Batch rendering
+
+def render_figure(cmgFile, outDir, formats, base=None):
+    """Load a '.cmg' configuration into a non-interactive prompt and print it
+    once for each file format, to files named base in outDir (default: the name
+    of cmgFile without its extension). Runs in a process pool worker, so the figure is
+    closed afterwards to leave the worker ready for the next one. Returns the
+    time taken, the files written and any error message. The plots' data is
+    released from the data store, so a worker's memory stays within the store
+    budget however many figures it renders."""
+    import matplotlib.pyplot as plt
+    from .prompt import cmgPrompt
+    t0 = time.perf_counter()
+    if base is None:
+        base = os.path.splitext(os.path.basename(cmgFile))[0]
+    outFiles = [os.path.join(outDir, base + '.' + fmt) for fmt in formats]
+    log = io.StringIO()
+    prompt = None
+    try:
+        with contextlib.redirect_stdout(log): #silence prompt messages
+            prompt = cmgPrompt(mode='launch', interactive=False)
+            prompt.do_load(cmgFile)
+            if prompt.errors:
+                raise IOError('\n'.join(prompt.errors))
+            for outFile in outFiles:
+                prompt.do_print(outFile)
+        error = None
+    except Exception as err:
+        error = "{}: {}".format(type(err).__name__, err)
+        outFiles = []
+    finally:
+        if prompt is not None:
+            prompt._close_figures() #release the worker's references to the data
+        plt.close('all')
+    return time.perf_counter() - t0, outFiles, error
+
+def _render_parser():
+    parser = argparse.ArgumentParser(prog='python -m cmdGraph render',
+        description="Render cmdGraph '.cmg' configurations to image files without "
+        "opening the interactive prompt.")
+    parser.add_argument('files', nargs='+', metavar='file.cmg')
+    parser.add_argument('--out-dir', default='.', 
+        help="directory for the rendered images (default: current directory)")
+    parser.add_argument('--format', default='pdf',
+        help="comma separated list of file formats, e.g 'pdf,png' (default: pdf)")
+    parser.add_argument('--jobs', type=int, default=None,
+        help="number of worker processes (default: number of CPUs)")
+    return parser
+
+def _output_names(cmgFiles):
+    """Base names of the images rendered from cmgFiles. A file is named after
+    the '.cmg' file without its extension, unless that name is shared with
+    another file, as for 'f.cmg' and 'f.cmgz' or 'a/f.cmg' and 'b/f.cmg'. Those
+    are named after their path from the directory the files have in common,
+    e.g 'f_cmgz' or 'a_f_cmg'. Raises ValueError if names still collide."""
+    names = [os.path.splitext(os.path.basename(cmgFile))[0] for cmgFile in cmgFiles]
+    shared = {name for name in names if names.count(name) > 1}
+    if shared:
+        paths = [os.path.abspath(cmgFile) for cmgFile in cmgFiles]
+        common = os.path.commonpath([os.path.dirname(path) for path in paths])
+        for i, path in enumerate(paths):
+            if names[i] in shared:
+                names[i] = os.path.relpath(path, common).replace(os.sep, '_').replace('.', '_')
+    for name in dict.fromkeys(names):
+        clashing = [cmgFile for cmgFile, other in zip(cmgFiles, names) if other == name]
+        if len(clashing) > 1:
+            raise ValueError("{} would all be rendered to '{}'".format(
+                ', '.join("'{}'".format(cmgFile) for cmgFile in clashing), name))
+    return names
+
+def _render_pool(cmgFiles, outDir, formats, jobs, bases):
+    """Render figures with render_figure in a pool of jobs worker processes."""
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(render_figure, cmgFile, outDir, formats, base) 
+            for cmgFile, base in zip(cmgFiles, bases)
+            ]
+        results = []
+        for cmgFile, future in zip(cmgFiles, futures):
+            try:
+                results.append(future.result())
+            except Exception as err: #worker died
+                results.append((0., [], "{}: {}".format(type(err).__name__, err)))
+    return results
+
+def main(argv):
+    """Render every '.cmg' file given on the command line, spread across a
+    process pool with one figure per worker at a time, and print a summary of
+    the time taken for each figure. Returns the number of figures that failed.
+    With a single job the figures are rendered in this process, without a pool,
+    so that terminating the process stops the rendering.
+    """
+    parser = _render_parser()
+    args = parser.parse_args(argv)
+    try:
+        bases = _output_names(args.files)
+    except ValueError as err:
+        parser.error(err)
+    formats = [fmt.strip().lstrip('.') for fmt in args.format.split(',') if fmt.strip()]
+    os.makedirs(args.out_dir, exist_ok=True)
+    os.environ['MPLBACKEND'] = 'Agg' #non-GUI backend, inherited by the workers
+    jobs = min(len(args.files), args.jobs or os.cpu_count() or 1)
+    t0 = time.perf_counter()
+    if jobs == 1:
+        results = [
+            render_figure(cmgFile, args.out_dir, formats, base) 
+            for cmgFile, base in zip(args.files, bases)
+            ]
+    else:
+        results = _render_pool(args.files, args.out_dir, formats, jobs, bases)
+    total = time.perf_counter() - t0
+    failed = 0
+    width = max(len(cmgFile) for cmgFile in args.files)
+    print("{:<{w}}  {:>9}  {}".format("figure", "time (s)", "output", w=width))
+    for cmgFile, (elapsed, outFiles, error) in zip(args.files, results):
+        if error:
+            failed += 1
+            print("{:<{w}}  {:>9.2f}  FAILED".format(cmgFile, elapsed, w=width))
+            print('    ' + error.replace('\n', '\n    '))
+        else:
+            print("{:<{w}}  {:>9.2f}  {}".format(cmgFile, elapsed, ', '.join(outFiles), w=width))
+    print("Rendered {} of {} figures in {:.2f} s using {} worker(s).".format(
+        len(args.files) - failed, len(args.files), total, jobs))
+    return failed
@@ -0,0 +1,139 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .instrument import data_bytes
+from .data import read_files
+
+_storeBytes_ = 1024**3 #default memory budget, 1 GB
+
+### Store Classes
+
+class DataStore:
+    """Session store of parsed Data objects, shared by every View and figure.
+
+    Entries are keyed by the absolute path, size and modification time of the
+    source file together with the reader options, so a file is read again once
+    it changes. The reader class is not part of the key, detect_filetype always
+    chooses the same reader for the same file contents.
+
+    Every plot of a Data object holds a reference to its entry, taken with
+    acquire when the plot is added and dropped with release when its View is
+    closed, as by a change of mode. Entries that no plot references are kept
+    for reuse until the memory they hold exceeds maxBytes, when the least
+    recently used of them are dropped. Referenced entries are never dropped.
+    Arrays memory-mapped from the data cache are not counted, as their memory
+    belongs to the operating system's page cache.
+
+    The store is used from background job threads as well as the prompt, so
+    every method holds a lock.
+    """
+    def __init__(self, maxBytes=_storeBytes_):
+        self.maxBytes = maxBytes
+        self.enabled  = True
+        self._entries = OrderedDict() #key: [Data, references, bytes], least recent first
+        self._lock    = threading.Lock()
+
+    @staticmethod
+    def _key(fName, opts):
+        """Key of a file read with reader options opts, or None if the file can
+        not be found."""
+        try:
+            stat = os.stat(fName)
+        except OSError:
+            return None
+        return (os.path.abspath(fName), stat.st_size, stat.st_mtime_ns, repr(sorted(opts.items())))
+
+    def get(self, fName, opts):
+        """Return the stored Data of a file read with reader options opts, or
+        None if it is not in the store."""
+        key = self._key(fName, opts) if self.enabled else None
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key) #mark as recently used
+            return self._entries[key][0]
+
+    def put(self, fName, opts, _Data):
+        """Store the Data read from a file with reader options opts, without any
+        references. Followed files are never stored, their data keeps changing."""
+        if not self.enabled or opts.get('follow'):
+            return
+        key = self._key(fName, opts)
+        if key is None:
+            return
+        nbytes, mapped = data_bytes(_Data)
+        _Data._storeKey = key
+        with self._lock:
+            refs = self._entries[key][1] if key in self._entries else 0
+            self._entries[key] = [_Data, refs, 0 if mapped else nbytes]
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def read_files(self, fNames, workers=None, **opts):
+        """Read files with reader options opts as data.read_files does, reusing
+        the Data of files already in the store and storing the rest."""
+        out = [self.get(fName, opts) for fName in fNames]
+        toRead = [fName for fName, _Data in zip(fNames, out) if _Data is None]
+        read = iter(read_files(toRead, workers, **opts))
+        for i, fName in enumerate(fNames):
+            if out[i] is None:
+                out[i] = next(read)
+                if out[i] is not None and not isinstance(out[i], Exception):
+                    self.put(fName, opts, out[i])
+        return out
+
+    def acquire(self, _Data):
+        """Add a reference to the entry of a Data object, for a new plot. An
+        entry that was dropped while its Data was waiting to be plotted is
+        stored again."""
+        key = getattr(_Data, '_storeKey', None)
+        if key is None:
+            return
+        with self._lock:
+            if key not in self._entries:
+                nbytes, mapped = data_bytes(_Data)
+                self._entries[key] = [_Data, 0, 0 if mapped else nbytes]
+            self._entries[key][1] += 1
+            self._entries.move_to_end(key)
+
+    def release(self, _Data):
+        """Drop a reference to the entry of a Data object, when its plot is
+        removed. The entry stays in the store until it is evicted."""
+        key = getattr(_Data, '_storeKey', None)
+        with self._lock:
+            if key in self._entries:
+                self._entries[key][1] = max(self._entries[key][1] - 1, 0)
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used unreferenced entries until the store fits
+        its budget. Called with the lock held."""
+        total = sum(nbytes for _, _, nbytes in self._entries.values())
+        for key, (_, refs, nbytes) in list(self._entries.items()):
+            if total <= self.maxBytes:
+                break
+            if not refs:
+                del self._entries[key]
+                total -= nbytes
+
+    def evict(self):
+        """Drop unreferenced entries until the store fits its budget."""
+        with self._lock:
+            self._evict()
+
+    def clear(self):
+        """Drop every entry that no plot references."""
+        with self._lock:
+            for key, (_, refs, _) in list(self._entries.items()):
+                if not refs:
+                    del self._entries[key]
+
+    def stats(self):
+        """Return the number of entries, the number referenced by plots and the
+        bytes held by all entries."""
+        with self._lock:
+            entries = list(self._entries.values())
+        return len(entries), sum(1 for _, refs, _ in entries if refs), sum(n for _, _, n in entries)
+
+dataStore = DataStore() #shared instance used by the program
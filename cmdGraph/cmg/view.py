@@ -3,10 +3,14 @@ import argparse #for figure arguments
 import numpy as np #for... need I explain?
 import matplotlib #urm... seems kinda obvious
 import matplotlib.pyplot as plt #convenience
-import pandas as pd
+import os
 import sys
 
-from .data import xyData, stickData, cmgData, duoOutData, roueffData, detect_filetype
+from .data import xyData, stickData, cmgData, duoOutData, roueffData, detect_filetype, read_data
+from .match import KeyIndex
+from .store import dataStore
+from .data import _small_
+from .misc import minmax_decimate, bin_sticks, stick_segments, viewport_window, window_covers
 
 
 ### View Classes
@@ -27,6 +31,8 @@ class _View:
     
     See existing subclasses for examples.
     """
+    followInterval = 1000 #milliseconds between checks of followed files
+
     def __init__(self, figure=None, mode=None):
         """View mode superclass with necessary functions, do not overwrite."""
         self.fig       = figure
@@ -34,6 +40,12 @@ class _View:
         self.plots     = []
         self.livePlots = self.plots
         self.argNames  = []
+        self.deferred  = False #queue legend rebuilds until flush, set by cmgPrompt transactions
+        self._legendStale = False
+        self._following = [] #plots of followed files, polled by _followTimer
+        self._followTimer = None
+        self._inViewport = False #guards _update_viewport against re-entry
+        self.preloaded = {} #Data read ahead of figure commands, by (file, options), set by cmgPrompt
         self.parser    = argparse.ArgumentParser(
             usage="Figure commands should have a '-' or '--' in front.\n"
             "       Type '-h' for a list of figure commands available in the current mode."
@@ -56,21 +68,36 @@ class _View:
         then of plots if command is not recognised as an axes property.
 
         """
+        args = self.read_args(inp)
+        if args is None:
+            return False
+        for argName, inp in args:
+            self.apply(argName, inp)
+        return True
+
+    def read_args(self, inp):
+        """Parse a list of argument strings, returning a list of (argument name,
+        value) pairs in the order the View applies them, or None if argparse
+        fails to parse the input."""
         try: #catch argparse system exit
             args = self.parser.parse_args(inp) #use argparse to parse args
         except:
-            return False
-        for argName in self.argNames:
-            if hasattr(args, argName):
-                inp = getattr(args, argName)
-                if hasattr(self, '_set_'+argName): #axes command?
-                    _set = getattr(self, '_set_'+argName)
-                    _set(inp)
-                else: #plot command?
-                    for p, plot in enumerate(self.livePlots):
-                        _set = getattr(plot, '_set_'+argName)
-                        _set(inp[p])
-        return True
+            return None
+        return [
+            (argName, getattr(args, argName)) for argName in self.argNames 
+            if hasattr(args, argName)
+            ]
+
+    def apply(self, argName, inp):
+        """Call the '_set_' method for a parsed argument, on the View for axes
+        arguments or else on every live plot, with one value per plot."""
+        if hasattr(self, '_set_'+argName): #axes command?
+            _set = getattr(self, '_set_'+argName)
+            _set(inp)
+        else: #plot command?
+            for p, plot in enumerate(self.livePlots):
+                _set = getattr(plot, '_set_'+argName)
+                _set(inp[p])
 
     def _add_arg(self, *args, **kwargs):
         """Adds argument to View instance, essentially a wrapper for argparse
@@ -99,15 +126,95 @@ class _View:
             self._Data = data
             self.ax  = ax
 
+    def held_data(self):
+        """Return the Data objects the View holds itself, rather than through
+        its plots. They are referenced in the data store while the View is open
+        and saved in bundles along with the data of the plots."""
+        return []
+
     def add_plot(self, data):
         """Method for adding a Plot instance to the current View with data from
         a given Data object. Adds plot to list of plots in current View and resets
         live plots. Assumes plot is being added to current matplotlib axes.
         """
         plot = self.Plot(data, plt.gca()) #plot object init method creates matplotlib artist
+        plot._view = self
         self.plots.append(plot) #add to list of plots
         self.livePlots = self.plots #update live plots
 
+    def follow(self, plot):
+        """Follow the data file of a plot, checking it for appended rows on a 
+        timer of the figure's GUI event loop. Returns False if the plot can not
+        be extended with new rows."""
+        if not (plot._Data._followable and hasattr(plot, '_extend')):
+            return False
+        self._following.append(plot)
+        if self._followTimer is None:
+            self._followTimer = self.fig.canvas.new_timer(interval=self.followInterval)
+            self._followTimer.add_callback(self._poll)
+            self._followTimer.start()
+        return True
+
+    def _poll(self):
+        """Read the rows appended to every followed file, extend their plots and
+        redraw the figure once if any have changed."""
+        if not plt.fignum_exists(self.fig.number): #figure closed, e.g by mode
+            self._followTimer.stop()
+            return
+        changed = False
+        appended = {} #by Data, read once for plots that share it
+        for plot in self._following:
+            if id(plot._Data) not in appended:
+                try:
+                    appended[id(plot._Data)] = plot._Data.read_appended()
+                except (OSError, ValueError): #file moved away, try again next time
+                    appended[id(plot._Data)] = (0, False)
+            nNew, reset = appended[id(plot._Data)]
+            if nNew or reset:
+                plot._extend(reset)
+                changed = True
+        if changed:
+            self.fig.canvas.draw_idle()
+
+    def _connect_viewport(self):
+        """Call _update_viewport whenever the visible x range changes, by 
+        --xrange, pan or zoom, or the figure is resized."""
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self._on_viewport())
+        self.fig.canvas.mpl_connect('resize_event', lambda event: self._on_viewport())
+
+    def _on_viewport(self):
+        """Call _update_viewport, unless the call comes from inside it, as when
+        reading the x limits of the axes autoscales them and so changes them."""
+        if self._inViewport:
+            return
+        self._inViewport = True
+        try:
+            self._update_viewport()
+        finally:
+            self._inViewport = False
+
+    def _update_viewport(self):
+        """Update the data given to the artists of every plot for the visible x
+        range. Overwritten by Views that slice or decimate their data."""
+        pass
+
+    def _update_legend(self):
+        """Rebuild the legend of the axes, or if the View is deferred, mark it
+        to be rebuilt when the View is flushed."""
+        if self.deferred:
+            self._legendStale = True
+        else:
+            self.ax.legend()
+
+    def flush(self):
+        """End deferred mode, rebuild the legend if any rebuilds were queued and
+        request a single redraw of the figure."""
+        self.deferred = False
+        if self._legendStale:
+            self._legendStale = False
+            self.ax.legend()
+        self.fig.canvas.draw_idle()
+
     def _set_xlabel(self, inp):
         """Set x label for axis."""
         self._prop_xlabel = inp[0]
@@ -157,6 +264,8 @@ class GraphView(_View):
     consists of a single axes, and can contain any number of xyData Plot objects.
     It is also the default View mode opened when the program starts.
     """
+    cutRows = 100000 #lines with more rows are windowed or decimated to the view
+
     def __init__(self, fig):
         """Add axes to the provided figure and set the view mode to 'graph'. The
         available arguments for the user in view mode are defined below, and each
@@ -165,6 +274,12 @@ class GraphView(_View):
         """
         _View.__init__(self, figure=fig, mode='graph')
         self.ax = fig.add_subplot(111)
+        self._lod = False
+        self._connect_viewport()
+        # Axes arguments
+        self._add_arg('-lod', '--lod', nargs=1, type=str, metavar='str',
+            help="level of detail mode, 'on' draws lines decimated to the min and "
+            "max of each pixel column, recomputed on zoom or resize")
         # Line arguments
         self._add_arg('-lw', '--linewidth',  nargs='+', type=float, metavar='float', 
             help="Width of plot line.")
@@ -202,7 +317,83 @@ class GraphView(_View):
             """
             _View.Plot.__init__(self, data, ax)
             x, y = self._Data.dat
-            self._plot, = ax.plot(x, y)
+            self._nRows  = len(x)
+            self._cut    = len(x) > GraphView.cutRows #large enough to window or decimate
+            if self._cut: #the line is given its data for the view by _show
+                self._plot, = ax.plot([], [])
+                self._update_datalim()
+            else:
+                self._plot, = ax.plot(x, y)
+            self._lod    = False
+            self._window = None  #x range of the data given to the line, None for all
+            self._decimated = False
+
+        def _update_datalim(self):
+            """Extend the data limits of the axes by the bounds of all of the
+            data, not only the rows given to the line."""
+            x, y = self._Data.dat
+            if len(x):
+                self.ax.update_datalim([[np.nanmin(x), np.nanmin(y)], [np.nanmax(x), np.nanmax(y)]])
+
+        def _extend(self, reset=False):
+            """Show the rows appended to the data of a followed file, growing
+            the data limits by the new rows only. If the file was read again
+            from the start, the data limits are recomputed from the new data.
+            The line is given the new data first, so limits from before a
+            truncation do not survive a recompute."""
+            x, y = self._Data.dat
+            self._cut = len(x) > GraphView.cutRows
+            self._show(self._lod, force=True)
+            if reset:
+                self._view._relim()
+            elif len(x) > self._nRows:
+                self.ax.update_datalim(np.column_stack([x[self._nRows:], y[self._nRows:]]))
+            self._nRows = len(x)
+            self.ax.autoscale_view()
+
+        def _show(self, lod, force=False):
+            """Set the line data for the visible x range. If lod is True and the
+            line has no markers, the data is decimated to the min and max y of
+            each pixel column. Otherwise, if the data can be cut by x, as for a
+            line with x in order or markers with no line, only the rows within 
+            a window around the visible range are given to the line. They are
+            found by binary search of the sorted x index of the data, and are
+            only found again once the view leaves the window or zooms well in.
+            Otherwise the line is given all of the data, as is a line with at
+            most cutRows rows, for which cutting costs more than it saves."""
+            self._lod = lod
+            if not (self._cut or self._window or self._decimated or force):
+                return #small data, already shown in full
+            x, y = self._Data.dat
+            if not self._cut:
+                self._window, self._decimated = None, False
+                self._plot.set_data(x, y)
+                return
+            if not len(x):
+                return
+            none = [None, 'None', 'none', '', ' ']
+            markers = self._plot.get_marker() not in none
+            line = self._plot.get_linestyle() not in none
+            inOrder = self._Data.sorted_order() is None
+            xmin, xmax = sorted(self.ax.get_xlim())
+            if lod and inOrder and not markers:
+                nPix = max(int(self.ax.get_window_extent().width), 1)
+                rows = self._Data.x_rows(xmin, xmax, edges=True)
+                x, y = minmax_decimate(x[rows], y[rows], xmin, xmax, nPix)
+                window, decimated = None, True
+            elif inOrder or not line:
+                if window_covers(self._window, xmin, xmax) and not (self._decimated or force):
+                    return #data for the view is already in the window
+                window = viewport_window(xmin, xmax)
+                rows = self._Data.x_rows(*window, edges=line)
+                x, y = x[rows], y[rows]
+                decimated = False
+            else:
+                if self._window is None and not (self._decimated or force):
+                    return #already showing all of the data
+                window, decimated = None, False
+            self._window, self._decimated = window, decimated
+            self._plot.set_data(x, y)
         # Line methods
         def _set_linewidth(self, inp):
             """Set line width of plot."""
@@ -223,12 +414,14 @@ class GraphView(_View):
             """Set line style of plot."""
             self._prop_linestyle = inp
             plt.setp(self._plot, ls=inp)
+            self._show(self._lod, force=True) #markers with no line are cut unordered
         def _set_marker(self, inp):
             """Set marker style of plot."""
             if inp == 'none':
                 inp = 'None'
             self._prop_marker = inp
             plt.setp(self._plot, marker=inp)
+            self._show(self._lod, force=True) #markers are never decimated
         def _set_markersize(self, inp):
             """Set size of plot markers."""
             self._prop_markersize = inp
@@ -242,12 +435,46 @@ class GraphView(_View):
             else:
                 inp = inp.replace('#', ' ')
                 plt.setp(self._plot, label=inp)
-            plt.legend()
+            self._view._update_legend()
+
+    def _relim(self):
+        """Recompute the data limits of the axes from the data of every plot,
+        rather than only the rows given to their lines."""
+        self.ax.relim()
+        for plot in self.plots:
+            if plot._cut:
+                plot._update_datalim()
 
     def add_plot(self, data):
+        """Add a plot and cut its data for the current view. A large plot's
+        line starts empty and is only given the rows for the view, so the full
+        data never goes to matplotlib. Plots already in the View are only cut
+        again, by _on_viewport, if the new data changes the x limits."""
         _View.add_plot(self, data)
         self._set_xrange('* *')
         self._set_yrange('* *')
+        self._inViewport = True
+        try:
+            plot = self.plots[-1]
+            plot._show(self._lod, force=plot._cut) #a cut line has no data yet
+        finally:
+            self._inViewport = False
+
+    def _set_figsize(self, inp):
+        """Set figure size, and update decimation for the new pixel width."""
+        _View._set_figsize(self, inp)
+        self._on_viewport()
+
+    def _set_lod(self, inp):
+        """Turn level of detail mode on or off."""
+        self._prop_lod = inp[0]
+        self._lod = inp[0] == 'on'
+        self._on_viewport()
+
+    def _update_viewport(self):
+        """Cut or decimate the data of every plot for the current view."""
+        for plot in self.plots:
+            plot._show(self._lod)
 
 class StickView(_View):
     """Simple x-y data View class.
@@ -266,6 +493,18 @@ class StickView(_View):
         _View.__init__(self, figure=fig, mode='stick')
         self.ax = fig.add_subplot(111)
         #self.ax.set_yscale('log')
+        self._aggregate = 'off'
+        self._threshold = None
+        self._topn      = None
+        self._connect_viewport()
+        # Axes arguments
+        self._add_arg('-agg', '--aggregate', nargs=1, type=str, metavar='str',
+            help="draw one stick per pixel column in the visible range, with the "
+            "'max' or 'sum' of its intensities, or 'off' to draw every stick")
+        self._add_arg('-th', '--threshold', nargs=1, type=str, metavar='float',
+            help="only draw sticks with at least this intensity, 'none' for all")
+        self._add_arg('-top', '--topn', nargs=1, type=str, metavar='int',
+            help="only draw the N most intense sticks of each plot, 'none' for all")
         # Line arguments
         self._add_arg('-lw', '--linewidth', nargs='+', type=str, metavar='float',
             help="Width of plot line.")
@@ -300,10 +539,78 @@ class StickView(_View):
             '_prop_' attribute to allow the configuration to be written to file.
             """
             _View.Plot.__init__(self, data, ax)
-            sticks = self._Data.dat
+            x, height = self._Data.dat
+            if len(x):
+                ax.update_datalim([[x.min(), self._Data.ybounds[0]], [x.max(), self._Data.ybounds[1]]])
+                ax.autoscale_view()
             self._plot = ax.add_collection(
-                matplotlib.collections.LineCollection(sticks))
+                matplotlib.collections.LineCollection([]), autolim=False
+                ) #sticks are set by _select and _draw_sticks
             self._markers = None
+            self._nRows = len(x)
+            self._select()
+
+        def _extend(self, reset=False):
+            """Show the sticks appended to the data of a followed file, growing
+            the data limits by the new sticks only. If the file was read again
+            from the start, the data limits are recomputed from the new data.
+            The sticks are drawn before the limits are changed."""
+            x, height = self._Data.dat
+            self._select(self._view._threshold, self._view._topn)
+            self._draw_sticks(self._view._aggregate)
+            if reset:
+                self._view._relim()
+            elif len(x) > self._nRows:
+                n0 = self._nRows
+                self.ax.update_datalim([[x[n0:].min(), self._Data.ybounds[0]], [x[n0:].max(), self._Data.ybounds[1]]])
+            self._nRows = len(x)
+            self.ax.autoscale_view()
+
+        def _select(self, threshold=None, topn=None):
+            """Choose which sticks of the data are drawn, keeping only those with
+            at least threshold intensity and at most the topn most intense. The
+            intensity-sorted index of the data is used so the selection costs
+            only a binary search and a sort of the selected sticks by x."""
+            x, height = self._Data.dat
+            if threshold is None and topn is None:
+                order = self._Data.sorted_order()
+            else:
+                order = self._Data.intensity_order()
+                n = len(order)
+                if threshold is not None:
+                    n = np.searchsorted(-height[order], -threshold, side='right')
+                if topn is not None:
+                    n = min(n, topn)
+                order = order[:n]
+                order = order[np.argsort(x[order], kind='stable')]
+            self._x, self._height = (x, height) if order is None else (x[order], height[order])
+            self._window = None #selection has not been drawn
+
+        def _draw_sticks(self, aggregate='off'):
+            """Set the drawn sticks from the current selection, which is sorted by
+            x. If aggregate is 'max' or 'sum', sticks in the visible x range are 
+            binned to one per pixel column. Otherwise the sticks within a window
+            around the visible range are drawn, found by binary search, and are
+            only found again once the view leaves the window or zooms well in."""
+            x, height = self._x, self._height
+            xmin, xmax = sorted(self.ax.get_xlim())
+            if aggregate in ['max', 'sum']:
+                nPix = max(int(self.ax.get_window_extent().width), 1)
+                i0 = np.searchsorted(x, xmin)
+                i1 = np.searchsorted(x, xmax, side='right')
+                x, height = bin_sticks(x[i0:i1], height[i0:i1], xmin, xmax, nPix, aggregate)
+                self._window = None
+            elif window_covers(self._window, xmin, xmax):
+                return #sticks for the view are already in the window
+            else:
+                self._window = viewport_window(xmin, xmax)
+                i0 = np.searchsorted(x, self._window[0])
+                i1 = np.searchsorted(x, self._window[1], side='right')
+                x, height = x[i0:i1], height[i0:i1]
+            self._plot.set_segments(stick_segments(x, height, _small_))
+            if self._markers:
+                self._markers.set_data(x, height)
+            self._shown = (x, height)
         # Line methods
         def _set_linewidth(self, inp):
             """Set line width of plot."""
@@ -356,93 +663,166 @@ class StickView(_View):
             else:
                 inp = inp.replace('#', ' ')
                 plt.setp(self._plot, label=inp)
-            plt.legend()
+            self._view._update_legend()
 
         def _add_stick_markers(self):
             "Plots scatter graph as markers for stick view"
-            self._markers, = plt.plot(self._Data.dat[:,1,0], self._Data.dat[:,1,1], 
+            self._markers, = plt.plot(*self._shown, 
                                      linestyle='none', linewidth=0,
-                                     color=self._prop_linecolour)
+                                     color=getattr(self, '_prop_linecolour', None))
+
+    def _relim(self):
+        """Recompute the data limits of the axes from the data of every plot."""
+        self.ax.ignore_existing_data_limits = True
+        for plot in self.plots:
+            x, height = plot._Data.dat
+            if len(x):
+                self.ax.update_datalim([[x.min(), plot._Data.ybounds[0]], [x.max(), plot._Data.ybounds[1]]])
+
+    def add_plot(self, data):
+        _View.add_plot(self, data)
+        self.plots[-1]._select(self._threshold, self._topn)
+        self.plots[-1]._draw_sticks(self._aggregate)
+
+    def _set_aggregate(self, inp):
+        """Set stick aggregation mode, 'max', 'sum' or 'off'."""
+        self._prop_aggregate = inp[0]
+        self._aggregate = inp[0]
+        self._update_sticks()
+    def _set_threshold(self, inp):
+        """Set the minimum intensity of drawn sticks."""
+        self._prop_threshold = inp[0]
+        self._threshold = None if inp[0] == 'none' else float(inp[0])
+        self._update_sticks(select=True)
+    def _set_topn(self, inp):
+        """Set the number of most intense sticks drawn."""
+        self._prop_topn = inp[0]
+        self._topn = None if inp[0] == 'none' else int(inp[0])
+        self._update_sticks(select=True)
+
+    def _update_viewport(self):
+        """Redraw the sticks of every plot for the current view."""
+        self._update_sticks()
+
+    def _update_sticks(self, select=False):
+        """Redo the stick selection if select is True, then redraw the sticks of
+        every plot for the current view."""
+        for plot in self.plots:
+            if select:
+                plot._select(self._threshold, self._topn)
+            plot._draw_sticks(self._aggregate)
 
 class linelistComparisonView(_View):
+    """View comparing the lines of primary linelists, added with adat, to those
+    of one or more secondary linelists, given with --compare. 
+
+    Lines are matched on their quantum numbers with a KeyIndex, built once for
+    each primary linelist, against which every secondary is matched in 
+    parallel. Each match gives one series per primary and secondary, drawn 
+    against the final state energy of the primary lines. Both residuals, the
+    ratio of Einstein A coefficients and the difference in wavenumber, are
+    computed with the match, so --compareon switches between them without 
+    matching again.
+    """
+    mergers = [
+        'rotational_final', 'rotational_initial', 
+        'vibrational_final', 'vibrational_initial'
+        ] #columns to match on
+    compared = ['energy_final_cm', 'einstein_A', 'wavenumber'] #columns of the residuals
+
+    @classmethod
+    def _missing(cls, _Data):
+        """Return the columns a linelist needs for comparison that its data does
+        not have, as when they were left out with adat --usecols."""
+        names = _Data.dat.dtype.names or ()
+        return [col for col in cls.mergers + cls.compared if col not in names]
+
     def __init__(self, fig):
-        _View.__init__(self, figure=fig, mode='resids')
+        _View.__init__(self, figure=fig, mode='linelistComparison')
         self.ax = fig.add_subplot(111)
+        self._secondaries = [] #(file, Data) of the compared linelists
+        self._compareon   = 'A'
+        #Axes arguments
+        self._add_arg('-c', '--compare', nargs='+', type=str, metavar='file',
+            help="secondary linelist files to compare every plot to")
+        self._add_arg('-co', '--compareon', nargs=1, type=str, metavar='A|nu',
+            help="quantity to compare matched lines on, Einstein A ratio or wavenumber difference")
         #Line arguments
         self._add_arg('-lc', '--linecolour', nargs='+', type=str,   metavar='str',
-            help="line colours for plots in figure (any valid matplotlib colour, e.g 'red', 'blue')")
+            help="line colours for plots in figure, one per secondary separated by '/' (e.g 'red/blue')")
         self._add_arg('-m',  '--marker',     nargs='+', type=str,   metavar='str',
             help="marker styles for plots in figure (any valid matplotlib style, e.g 'o', 'x', 'none')")
         self._add_arg('-ms', '--markersize', nargs='+', type=str,   metavar='float',
             help="marker sizes for plots in figure (any valid matplotlib style, e.g '-', '--', 'none')")
         self._add_arg('-l', '--label', nargs='+', type=str,   metavar='str',
             help="labels for plots in figure legend, use '#' for spaces")
-    
+
     class Plot(_View.Plot):
         def __init__(self, data, ax):
             _View.Plot.__init__(self, data, ax) #store data and ax locally as self.data & self.ax
-            
-            # Ask for second linelist file to compare to
-            secFile       = input('Linelist file to compare to: ')
-            fType         = detect_filetype(secFile)
-            self._secData = fType(secFile).read_file()
-            
-            # Convert data to pandas dataframe for easy merging
-            mergers = [
-                'rotational_final', 'rotational_initial', 
-                'vibrational_final', 'vibrational_initial'
-                ] #column headers to merge on
-            self._dfPrim = pd.DataFrame(
-                data=self._Data.dat, columns=self._Data.cols
-                ).astype(self._Data.typedict)
-            self._dfSec = pd.DataFrame(
-                data=self._secData.dat, columns=self._secData.cols
-                ).astype(self._secData.typedict)
-            self._dfPrim.insert(0, 'line_number', 
-                np.arange(1, self._dfPrim.shape[0]+1)
-                ) #add column with index of line in original file
-            self._dfSec.insert(0, 'line_number', 
-                np.arange(1, self._dfSec.shape[0]+1)
-                )
-            # Merge on shortest linelist to minimise surplus lines
-            short = 'right' if self._dfSec.shape[0] < self._dfPrim.shape[0] else 'left'
-            self.dfComp = self._dfPrim.merge(self._dfSec, on=mergers, how=short)
-            # Print merge details
-            print("{0} has {1} entries; {2} has {3}. Matched {4} entries"
-                .format(
-                self._Data.fName, self._dfPrim.shape[0], secFile, 
-                self._dfSec.shape[0], self.dfComp.shape[0]
-                ))
-            self._set_compareon(
-                input("Merged, select quantity to compare on: ")
-            )
-        
-        def _set_compareon(self, inp):
-            """Select quantity to compare lines on."""
-            if hasattr(self, '_plot'):
-                self._plot.remove()
-            if inp in ['A', 'einstein']:
-                #pd.set_option('display.max_rows', 50000, 'display.max_columns', 100, 'display.width', 1000)
-                #fOut = open('garbage.txt', 'w')
-                #print(self.dfComp, file=fOut)
-                yVals = self.dfComp['einstein_A_x']/self.dfComp['einstein_A_y']
-            elif inp in ['nu', 'wavenumber']:
-                yVals = self.dfComp['wavenumber_x'] - self.dfComp['wavenumber_y']
+            self.index   = None #KeyIndex of the linelist, built by the first comparison
+            self.matches = [] #Match against each secondary linelist
+            self._resids = [] #{'x', 'A', 'nu'} arrays of each match
+            self._plot   = [] #one line per secondary linelist
+            self._secFiles = [] #file of each secondary linelist, for labels
+
+        def _compare(self, secondaries, compareon):
+            """Match the plot's linelist against every secondary (file, Data)
+            at once, compute the residuals of each match and draw them."""
+            if self.index is None:
+                self.index = KeyIndex(self._Data.dat, linelistComparisonView.mergers)
+            self.matches = self.index.match_all(_Data.dat for _, _Data in secondaries)
+            self._secFiles = [secFile for secFile, _ in secondaries]
+            self._resids = []
+            for (secFile, secData), match in zip(secondaries, self.matches):
+                print(match.summary(self._Data.fName, secFile))
+                prim = self._Data.dat[match.iIndex] #matched rows
+                sec  = secData.dat[match.iOther]
+                self._resids.append({
+                    'x' : prim['energy_final_cm'],
+                    'A' : prim['einstein_A']/sec['einstein_A'],
+                    'nu': prim['wavenumber'] - sec['wavenumber']
+                    })
+            self._draw(compareon)
+
+        def _draw(self, compareon):
+            """Draw the residual series of every match on compareon, each in
+            the next colour of the axes and labelled with its pair of files."""
+            for line in self._plot:
+                line.remove()
+            self._plot = [
+                self.ax.plot(resids['x'], resids[compareon], ls='none')[0] 
+                for resids in self._resids
+                ]
+            for argName in ['linecolour', 'marker', 'markersize']:
+                if hasattr(self, '_prop_' + argName):
+                    getattr(self, '_set_' + argName)(getattr(self, '_prop_' + argName))
+            if hasattr(self, '_prop_label'):
+                self._set_label(self._prop_label)
             else:
-                print("Comparison not recognised.")
-            xVals = self.dfComp['energy_final_cm_x']
-            self._plot, = plt.plot(xVals, yVals, ls='none')
+                self._label_series(os.path.basename(self._Data.fName))
+
+        def _label_series(self, name):
+            """Label each series with name and the secondary file it compares to."""
+            for line, secFile in zip(self._plot, self._secFiles):
+                line.set_label("{} vs {}".format(name, os.path.basename(secFile)))
+            if self._plot:
+                self._view._update_legend()
 
         def _set_linecolour(self, inp):
-            """Set line colour of plot."""
-            try:
-                print(inp)
-                inp = tuple(float(i) for i in inp.split(','))
-                print(inp)
-            except:
-                pass
+            """Set line colours of the plot's series, one colour for each
+            secondary linelist separated by '/', repeated if there are fewer
+            colours than secondaries."""
             self._prop_linecolour = inp
-            plt.setp(self._plot, color=inp)
+            colours = []
+            for colour in inp.split('/'):
+                try:
+                    colour = tuple(float(i) for i in colour.split(','))
+                except:
+                    pass
+                colours.append(colour)
+            for i, line in enumerate(self._plot):
+                line.set_color(colours[i % len(colours)])
         def _set_marker(self, inp):
             """Set marker style of plot."""
             if inp == 'none':
@@ -454,5 +834,74 @@ class linelistComparisonView(_View):
             self._prop_markersize = inp
             inp = float(inp)
             plt.setp(self._plot, ms=inp)
+        def _set_label(self, inp):
+            """Set legend labels of plot."""
+            self._prop_label = inp
+            if inp == 'none': #line has no label
+                plt.setp(self._plot, label='__nolegend__')
+                self._view._update_legend()
+            else:
+                self._label_series(inp.replace('#', ' '))
+
+    def held_data(self):
+        return [_Data for _, _Data in self._secondaries]
+
+    def add_plot(self, data):
+        _View.add_plot(self, data)
+        if self._secondaries:
+            self._compare_plot(self.plots[-1])
+
+    def _compare_plot(self, plot):
+        """Compare a plot to the secondaries, unless its linelist is missing
+        columns the comparison needs."""
+        missing = self._missing(plot._Data)
+        if missing:
+            print("Can not compare '{}', it has no {} column(s).".format(
+                plot._Data.fName, ', '.join(missing)))
+            return
+        plot._compare(self._secondaries, self._compareon)
 
+    def _set_compare(self, inp):
+        """Read the secondary linelists and compare every plot to them. Files
+        that can not be read, or lack columns the comparison needs, are
+        reported and left out. The secondaries are
+        referenced in the data store until they are replaced or the View is
+        closed, and are taken from preloaded when loaded from a bundle."""
+        self._prop_compare = ' '.join(inp)
+        key = lambda secFile: (secFile, repr([])) #read without reader options
+        toRead = [secFile for secFile in inp if key(secFile) not in self.preloaded]
+        read = dict(zip(toRead, dataStore.read_files(toRead)))
+        for _, secData in self._secondaries:
+            dataStore.release(secData)
+        self._secondaries = []
+        for secFile in inp:
+            secData = read[secFile] if secFile in read else self.preloaded[key(secFile)]
+            if isinstance(secData, Exception):
+                print("Could not read '{}': {}".format(secFile, secData))
+            elif secData is not None and self._missing(secData):
+                print("Can not compare to '{}', it has no {} column(s).".format(
+                    secFile, ', '.join(self._missing(secData))))
+            elif secData is not None:
+                self._secondaries.append((secFile, secData))
+                dataStore.acquire(secData)
+        for plot in self.plots:
+            self._compare_plot(plot)
+    def _set_compareon(self, inp):
+        """Select the quantity to compare lines on, 'A' for the ratio of Einstein
+        A coefficients or 'nu' for the difference in wavenumber."""
+        compareon = {'A': 'A', 'einstein': 'A', 'nu': 'nu', 'wavenumber': 'nu'}.get(inp[0])
+        if compareon is None:
+            print("Comparison not recognised.")
+            return
+        self._prop_compareon = inp[0]
+        self._compareon = compareon
+        for plot in self.plots:
+            plot._draw(compareon)
+        self.ax.relim()
+        self.ax.autoscale_view()
 
+viewModes = {
+    'graph'             : GraphView,
+    'stick'             : StickView,
+    'linelistComparison': linelistComparisonView
+    } #View class of each prompt mode